@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+server.py 压测脚本
+- 在本机临时端口启动 server.py，并启动一个模拟 localhost:3001 的后端（延迟、响应大小、错误率可配置）
+- 生成一份合成的 frontend/dist（index.html、带哈希的 JS/CSS、图片）
+- 以逐步提高的并发度驱动混合负载：SPA 路由、静态资源、GET/POST 接口、大响应体、大请求体、慢后端
+- 输出 JSON 结果（RPS、p50/p95/p99 延迟、服务器 RSS 和线程数），便于在不同提交之间对比
+
+用法:
+    python scripts/bench_server.py --concurrency 1,8,32 --duration 10 --output bench.json
+    python scripts/bench_server.py --server-args "--engine asyncio" --compare bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import itertools
+import shlex
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import collections
+import http.client
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_SCRIPT = os.path.join(SCRIPT_DIR, 'server.py')
+
+# 负载场景：名称 -> (方法, 路径, 请求体大小)；请求体大小为 0 表示没有请求体
+SCENARIOS = {
+    'spa': ('GET', '/parent/tasks', 0),
+    'asset': ('GET', '/assets/index-5f2c9a1b.js', 0),
+    'api_get': ('GET', '/api/child/dashboard', 0),
+    'api_post': ('POST', '/api/child/tasks/42/submit', 512),
+    'large_download': ('GET', '/api/large', 0),
+    'large_upload': ('POST', '/api/upload', 256 * 1024),
+    'slow': ('GET', '/api/slow', 0),
+}
+
+# mixed 负载中各场景的权重
+MIXED_WEIGHTS = {
+    'spa': 2,
+    'asset': 4,
+    'api_get': 4,
+    'api_post': 2,
+    'large_download': 1,
+    'large_upload': 1,
+    'slow': 1,
+}
+
+READY_TIMEOUT = 10      # 等待服务器/模拟后端启动的最长时间（秒）
+SAMPLE_INTERVAL = 0.2   # 采样服务器 RSS 和线程数的间隔（秒）
+
+
+# ==================== 模拟后端 ====================
+
+class StubBackendHandler(BaseHTTPRequestHandler):
+    """
+    模拟后端：HTTP/1.1 keep-alive，按配置延迟、返回固定大小的 JSON，按错误率返回 500
+    - /api/slow：使用 slow_latency 延迟
+    - /api/large：返回 large_size 字节的响应
+    - 其余路径：使用 latency 延迟，返回 payload_size 字节的响应
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，关闭 Nagle 以免 40ms 的延迟确认计入测量结果
+    disable_nagle_algorithm = True
+    config = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        config = self.config
+        path = self.path.split('?', 1)[0]
+        if path == '/api/slow':
+            time.sleep(config['slow_latency'])
+        elif config['latency']:
+            time.sleep(config['latency'])
+
+        if config['error_rate'] and random.random() < config['error_rate']:
+            status, body = 500, b'{"error":"stub error"}'
+        else:
+            size = config['large_size'] if path == '/api/large' else config['payload_size']
+            status, body = 200, config['bodies'][size]
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _handle
+
+
+def _json_body(size):
+    """生成指定大小的 JSON 响应体"""
+    padding = max(size - len('{"data":""}'), 0)
+    return b'{"data":"' + b'x' * padding + b'"}'
+
+
+def run_stub_backend(port, latency, slow_latency, payload_size, large_size, error_rate):
+    """模拟后端进程入口"""
+    StubBackendHandler.config = {
+        'latency': latency,
+        'slow_latency': slow_latency,
+        'payload_size': payload_size,
+        'large_size': large_size,
+        'error_rate': error_rate,
+        'bodies': {payload_size: _json_body(payload_size), large_size: _json_body(large_size)},
+    }
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubBackendHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+# ==================== 合成前端文件 ====================
+
+def make_dist_tree(root):
+    """生成与 vite 构建结果结构相同的 frontend/dist"""
+    assets = os.path.join(root, 'assets')
+    os.makedirs(assets, exist_ok=True)
+    rng = random.Random(0)
+    with open(os.path.join(root, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html><html lang="zh-CN"><head><meta charset="UTF-8"><title>星辰早晨</title>'
+                '<script type="module" src="/assets/index-5f2c9a1b.js"></script>'
+                '<link rel="stylesheet" href="/assets/index-8d3e7f40.css"></head>'
+                '<body><div id="root"></div></body></html>' + '<!-- padding -->' * 100)
+    with open(os.path.join(assets, 'index-5f2c9a1b.js'), 'w', encoding='utf-8') as f:
+        f.write(''.join(f'export function component{i}(props){{return props.value*{i};}}\n' for i in range(4000)))
+    with open(os.path.join(assets, 'index-8d3e7f40.css'), 'w', encoding='utf-8') as f:
+        f.write(''.join(f'.item-{i}{{margin:{i % 16}px;color:#{i % 4096:03x};}}\n' for i in range(1500)))
+    with open(os.path.join(assets, 'star-1a2b3c4d.png'), 'wb') as f:
+        f.write(bytes(rng.getrandbits(8) for _ in range(50 * 1024)))
+    with open(os.path.join(root, 'favicon.ico'), 'wb') as f:
+        f.write(bytes(rng.getrandbits(8) for _ in range(4 * 1024)))
+
+
+# ==================== 进程与端口 ====================
+
+def free_port():
+    """取一个空闲的临时端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=READY_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def _read_proc_status(pid):
+    """读取 /proc/<pid>/status 中的 RSS（KB）和线程数"""
+    rss = threads = 0
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+            elif line.startswith('Threads:'):
+                threads = int(line.split()[1])
+    return rss, threads
+
+
+def _child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # 第二列（进程名）可能包含空格，从最后一个 ')' 之后开始解析
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def process_tree_usage(pid):
+    """服务器进程（含 --workers 产生的子进程）的 RSS 总和（KB）和线程总数；不支持 /proc 的平台返回 None"""
+    if not os.path.isdir('/proc'):
+        return None
+    total_rss = total_threads = 0
+    for p in [pid] + _child_pids(pid):
+        try:
+            rss, threads = _read_proc_status(p)
+        except OSError:
+            continue
+        total_rss += rss
+        total_threads += threads
+    return total_rss, total_threads
+
+
+class UsageSampler(threading.Thread):
+    """压测期间定期采样服务器的 RSS 和线程数"""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            usage = process_tree_usage(self.pid)
+            if usage is None:
+                return
+            self.samples.append(usage)
+            self._stop_event.wait(SAMPLE_INTERVAL)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        usage = process_tree_usage(self.pid)
+        if usage is not None:
+            self.samples.append(usage)
+        if not self.samples:
+            return None
+        return {
+            'rss_peak_kb': max(rss for rss, _ in self.samples),
+            'rss_end_kb': self.samples[-1][0],
+            'threads_peak': max(threads for _, threads in self.samples),
+            'threads_end': self.samples[-1][1],
+        }
+
+
+# ==================== 负载生成 ====================
+
+def _client_thread(port, weights, deadline, seed, results):
+    """单个并发连接：在截止时间前循环发送请求，记录每个场景的延迟（秒）"""
+    rng = random.Random(seed)
+    names = list(weights)
+    cumulative = list(itertools.accumulate(weights[name] for name in names))
+    bodies = {size: b'{"v":"' + b'x' * max(size - 8, 0) + b'"}' for _, _, size in SCENARIOS.values() if size}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies = collections.defaultdict(list)
+    statuses = collections.Counter()
+    errors = 0
+    while time.monotonic() < deadline:
+        name = rng.choices(names, cum_weights=cumulative)[0]
+        method, path, body_size = SCENARIOS[name]
+        body = bodies.get(body_size) if body_size else None
+        headers = {'Accept-Encoding': 'gzip', 'Authorization': 'Bearer bench'}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            continue
+        latencies[name].append(time.perf_counter() - start)
+        statuses[response.status] += 1
+    conn.close()
+    results.append((dict(latencies), statuses, errors))
+
+
+def run_client_process(port, weights, threads, duration, seed, queue):
+    """负载进程：启动 threads 个并发连接，结束后把结果放入 queue"""
+    deadline = time.monotonic() + duration
+    results = []
+    workers = [threading.Thread(target=_client_thread, args=(port, weights, deadline, seed * 1000 + i, results))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    latencies = collections.defaultdict(list)
+    statuses = collections.Counter()
+    errors = 0
+    for thread_latencies, thread_statuses, thread_errors in results:
+        for name, values in thread_latencies.items():
+            latencies[name].extend(values)
+        statuses.update(thread_statuses)
+        errors += thread_errors
+    queue.put((dict(latencies), dict(statuses), errors))
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize_latencies(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    to_ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'count': len(values),
+        'mean': to_ms(sum(values) / len(values)),
+        'p50': to_ms(percentile(values, 0.50)),
+        'p95': to_ms(percentile(values, 0.95)),
+        'p99': to_ms(percentile(values, 0.99)),
+        'max': to_ms(values[-1]),
+    }
+
+
+def run_load(port, server_pid, workload, concurrency, duration, client_processes):
+    """以指定并发度运行一轮负载，返回该轮结果"""
+    weights = dict(MIXED_WEIGHTS) if workload == 'mixed' else {workload: 1}
+    processes = max(1, min(client_processes, concurrency))
+    per_process = [concurrency // processes + (1 if i < concurrency % processes else 0) for i in range(processes)]
+
+    queue = multiprocessing.Queue()
+    sampler = UsageSampler(server_pid)
+    sampler.start()
+    started = time.perf_counter()
+    clients = [multiprocessing.Process(target=run_client_process, args=(port, weights, n, duration, i + 1, queue))
+               for i, n in enumerate(per_process)]
+    for client in clients:
+        client.start()
+    outputs = [queue.get() for _ in clients]
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+    usage = sampler.stop()
+
+    latencies = collections.defaultdict(list)
+    statuses = collections.Counter()
+    errors = 0
+    for process_latencies, process_statuses, process_errors in outputs:
+        for name, values in process_latencies.items():
+            latencies[name].extend(values)
+        statuses.update(process_statuses)
+        errors += process_errors
+    all_latencies = [value for values in latencies.values() for value in values]
+    requests = len(all_latencies)
+    return {
+        'workload': workload,
+        'concurrency': concurrency,
+        'duration': round(elapsed, 3),
+        'requests': requests,
+        'errors': errors,
+        'status_counts': {str(code): count for code, count in sorted(statuses.items())},
+        'rps': round(requests / elapsed, 1) if elapsed else 0,
+        'latency_ms': summarize_latencies(all_latencies),
+        'scenarios': {name: summarize_latencies(values) for name, values in sorted(latencies.items())}
+                     if workload == 'mixed' else {},
+        'server': usage,
+    }
+
+
+# ==================== 结果对比 ====================
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline, current):
+    """按 (负载, 并发度) 对比两份报告的 RPS 和 p99"""
+    previous = {(r['workload'], r['concurrency']): r for r in baseline['results']}
+    print()
+    print(f"对比基准: {baseline['meta'].get('commit')} -> {current['meta'].get('commit')}")
+    print(f"{'负载':<16}{'并发':>6}{'RPS':>12}{'变化':>10}{'p99(ms)':>12}{'变化':>10}")
+    for result in current['results']:
+        old = previous.get((result['workload'], result['concurrency']))
+        if old is None:
+            continue
+        rps_change = (result['rps'] - old['rps']) / old['rps'] * 100 if old['rps'] else 0
+        old_p99, new_p99 = old['latency_ms'].get('p99'), result['latency_ms'].get('p99')
+        p99_change = (new_p99 - old_p99) / old_p99 * 100 if old_p99 and new_p99 is not None else 0
+        print(f"{result['workload']:<16}{result['concurrency']:>6}{result['rps']:>12.1f}{rps_change:>+9.1f}%"
+              f"{new_p99 or 0:>12.2f}{p99_change:>+9.1f}%")
+
+
+# ==================== 入口 ====================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='server.py 压测：模拟后端 + 合成前端文件 + 混合负载')
+    parser.add_argument('--concurrency', default='1,8,32,64',
+                        help='逐步提高的并发连接数，逗号分隔（默认 1,8,32,64）')
+    parser.add_argument('--duration', type=float, default=10, help='每轮压测的秒数（默认 10）')
+    parser.add_argument('--workloads', default='mixed',
+                        help=f'负载，逗号分隔：mixed 或 {",".join(SCENARIOS)}（默认 mixed）')
+    parser.add_argument('--client-processes', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='负载生成进程数，避免压测端本身成为瓶颈（默认 CPU 核数的一半）')
+    parser.add_argument('--server-args', default='',
+                        help='传给 server.py 的额外参数，如 "--engine asyncio --workers 2"')
+    parser.add_argument('--latency', type=float, default=5, help='模拟后端的普通延迟（毫秒，默认 5）')
+    parser.add_argument('--slow-latency', type=float, default=200, help='/api/slow 的延迟（毫秒，默认 200）')
+    parser.add_argument('--payload-size', type=int, default=2048, help='普通接口的响应大小（字节，默认 2048）')
+    parser.add_argument('--large-size', type=int, default=1024 * 1024, help='/api/large 的响应大小（字节，默认 1MB）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟后端返回 500 的比例（0~1，默认 0）')
+    parser.add_argument('--output', help='JSON 结果文件（默认输出到标准输出）')
+    parser.add_argument('--compare', help='与之前的 JSON 结果对比 RPS 和 p99')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    concurrency_levels = [int(value) for value in args.concurrency.split(',') if value.strip()]
+    workloads = [value.strip() for value in args.workloads.split(',') if value.strip()]
+    for workload in workloads:
+        if workload != 'mixed' and workload not in SCENARIOS:
+            print(f"[错误] 未知负载: {workload}", file=sys.stderr)
+            sys.exit(2)
+
+    dist_dir = tempfile.mkdtemp(prefix='bench-dist-')
+    make_dist_tree(dist_dir)
+    backend_port, server_port = free_port(), free_port()
+
+    stub = multiprocessing.Process(target=run_stub_backend, daemon=True, args=(
+        backend_port, args.latency / 1000, args.slow_latency / 1000, args.payload_size, args.large_size,
+        args.error_rate))
+    stub.start()
+    server_cmd = [sys.executable, SERVER_SCRIPT, '--host', '127.0.0.1', '--port', str(server_port),
+                  '--backend', f'127.0.0.1:{backend_port}', '--dist-dir', dist_dir,
+                  '--log-level', 'WARNING'] + shlex.split(args.server_args)
+    server = subprocess.Popen(server_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'server_args': args.server_args,
+            'backend': {'latency_ms': args.latency, 'slow_latency_ms': args.slow_latency,
+                        'payload_size': args.payload_size, 'large_size': args.large_size,
+                        'error_rate': args.error_rate},
+            'duration': args.duration,
+        },
+        'results': [],
+    }
+    try:
+        if not wait_for_port(backend_port) or not wait_for_port(server_port):
+            print("[错误] 服务器或模拟后端未能启动", file=sys.stderr)
+            sys.exit(1)
+        report['meta']['server_idle'] = process_tree_usage(server.pid)
+        for workload in workloads:
+            for concurrency in concurrency_levels:
+                print(f"[信息] {workload} 并发 {concurrency}，持续 {args.duration} 秒...", file=sys.stderr)
+                result = run_load(server_port, server.pid, workload, concurrency, args.duration, args.client_processes)
+                report['results'].append(result)
+                latency = result['latency_ms']
+                print(f"[成功] {result['rps']} req/s，p50 {latency.get('p50')} ms，p99 {latency.get('p99')} ms，"
+                      f"错误 {result['errors']}", file=sys.stderr)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        stub.terminate()
+        shutil.rmtree(dist_dir, ignore_errors=True)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"[信息] 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
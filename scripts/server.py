@@ -7,8 +7,36 @@
 
 import os
 import sys
+import html
+import stat
 import socket
-from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import select
+import signal
+import struct
+import mmap
+import time
+import argparse
+import base64
+import bisect
+import collections
+import contextlib
+import email.parser
+import email.utils
+import functools
+import gzip
+import hashlib
+import http.client
+import json
+import logging
+import logging.handlers
+import math
+import mimetypes
+import posixpath
+import queue
+import re
+import urllib.parse
+import zlib
+from http.server import HTTPServer, ThreadingHTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import urlparse
 import threading
 
@@ -17,27 +45,2135 @@ HOST = '0.0.0.0'  # 监听所有网络接口
 PORT = 80         # 端口号（HTTP默认端口）
 DOMAIN = 'starcoin.h5-online.com'
 
+# 后端 API 服务器配置
+BACKEND_HOST = 'localhost'
+BACKEND_PORT = 3001
+BACKEND_CONNECT_TIMEOUT = 3  # 连接后端超时（秒）
+BACKEND_TIMEOUT = 10         # 后端响应超时（秒）：等待响应头、以及读取响应体时两次读取之间的最长间隔
+
+# 个别路由的响应超时（秒），按路径精确匹配（不含查询参数），其余路由使用 BACKEND_TIMEOUT
+ROUTE_TIMEOUTS = {
+    '/api/parent/stats': 30,
+}
+
+# 静态文件根目录（--dist-dir 指定）；为 None 时使用项目根目录下的 frontend/dist
+STATIC_ROOT = None
+
+# 后端连接池配置
+UPSTREAM_POOL_SIZE = 32          # 最多保留的空闲长连接数
+UPSTREAM_POOL_IDLE_TIMEOUT = 4   # 空闲超过该秒数的连接直接丢弃（Node.js 默认 keepAliveTimeout 为 5 秒）
+UPSTREAM_WARMUP_CONNECTIONS = 4  # --warmup 时每个后端预先建立的长连接数（启动或平滑重启后立即有流量时才有意义）
+
+# 流式转发配置：请求体/响应体按固定大小分块转发，单个请求的内存占用不超过一个分块
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 每个处理线程复用一块固定大小的转发缓冲区
+_stream_buffers = threading.local()
+
+
+def get_stream_buffer():
+    """获取当前线程的转发缓冲区（memoryview），首次调用时分配"""
+    view = getattr(_stream_buffers, 'view', None)
+    if view is None:
+        view = memoryview(bytearray(STREAM_CHUNK_SIZE))
+        _stream_buffers.view = view
+    return view
+
+
+# ==================== 日志 ====================
+
+# 日志由后台线程统一写出，请求线程只把记录放进队列，不再争抢 stdout
+LOG_LEVEL = 'INFO'             # DEBUG 会额外输出代理开始、请求体长度等调试信息
+LOG_FORMAT = 'json'            # json：每行一个 JSON 对象；text：便于在控制台阅读
+LOG_QUEUE_SIZE = 10000         # 队列满时丢弃日志，不阻塞请求
+SLOW_REQUEST_THRESHOLD = 5.0   # 超过该秒数的请求以 WARNING 级别记录
+
+logger = logging.getLogger('star-morning.server')
+
+# 文本格式沿用原来的中文级别标签
+LEVEL_TAGS = {'DEBUG': '调试', 'INFO': '信息', 'WARNING': '警告', 'ERROR': '错误', 'CRITICAL': '错误'}
+
+
+def _format_log_time(record):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}'
+
+
+class JsonLogFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，record.fields 中的结构化字段直接并入"""
+
+    def format(self, record):
+        entry = {'time': _format_log_time(record), 'level': record.levelname, 'pid': record.process,
+                 'msg': record.getMessage()}
+        entry.update(getattr(record, 'fields', None) or {})
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextLogFormatter(logging.Formatter):
+    """[时间] [级别] 消息 key=value ..."""
+
+    def format(self, record):
+        line = f"[{_format_log_time(record)}] [{LEVEL_TAGS.get(record.levelname, record.levelname)}] {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """有界队列：写满时丢弃并计数，而不是阻塞请求线程或打印异常"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_log_listener = None
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, use_queue=True):
+    """
+    配置日志输出；use_queue 为 False 时同步写出（pre-fork 主进程使用：
+    fork 前不能有后台线程，否则子进程可能继承被锁住的 stdout）
+    """
+    global _log_listener
+    stop_logging()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonLogFormatter() if fmt == 'json' else TextLogFormatter())
+    if use_queue:
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        _log_listener = logging.handlers.QueueListener(log_queue, handler)
+        _log_listener.start()
+        handler = DroppingQueueHandler(log_queue)
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def stop_logging():
+    """写出队列中剩余的日志并停止后台线程"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+    sys.stdout.flush()
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def log_access(client, method, path, status, total, ctx=None):
+    """
+    每个请求完成后记录一条访问日志
+    代理请求附带耗时分解（毫秒）：connect 取得/建立后端连接，ttfb 发出请求到收到响应头，
+    transfer 转发响应体，proxy 为代理自身的其余开销（读请求体、钩子、写响应头等）
+    """
+    level = logging.WARNING if total > SLOW_REQUEST_THRESHOLD else logging.INFO
+    if not logger.isEnabledFor(level):
+        return
+    fields = {'type': 'access', 'client': client, 'method': method, 'path': path,
+              'status': status, 'total_ms': _ms(total)}
+    if ctx is not None and ctx.ttfb is not None:
+        transfer = ctx.transfer or 0.0
+        fields.update(connect_ms=_ms(ctx.connect), ttfb_ms=_ms(ctx.ttfb), transfer_ms=_ms(transfer),
+                      proxy_ms=_ms(max(total - ctx.connect - ctx.ttfb - transfer, 0.0)))
+    message = '%s %s %s' if level == logging.INFO else '%s %s %s - 请求处理时间过长'
+    logger.log(level, message, method, path, status, extra={'fields': fields})
+
+
+class UpstreamConnectTimeout(TimeoutError):
+    """连接后端超时（与等待响应超时区分开）"""
+
+
+class ClientBodyError(Exception):
+    """
+    读取客户端请求体失败（客户端提前断开、超时或 chunked 格式错误）
+    不继承 OSError/ValueError：这是客户端的问题，不能计入后端的健康检查和熔断统计
+    """
+
+
+class UpstreamConnectionPool:
+    """
+    后端长连接池（线程安全）
+    复用到后端的 HTTP/1.1 keep-alive 连接，避免每个请求都新建 TCP 连接
+    """
+
+    # 复用空闲连接时可能遇到的"连接已被后端关闭"类异常，换一个连接重试即可
+    STALE_ERRORS = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+
+    def __init__(self, host, port, max_size=UPSTREAM_POOL_SIZE, idle_timeout=UPSTREAM_POOL_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = collections.deque()  # (conn, 最后使用时间)，右端为最近归还
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now):
+        """关闭空闲超时的连接（调用方需持有锁）"""
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            conn.close()
+
+    @staticmethod
+    def _is_healthy(conn):
+        """健康检查：空闲连接上不应有可读数据，可读说明后端已关闭连接（EOF）或发送了意外数据"""
+        sock = conn.sock
+        if sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def acquire(self):
+        """取出一个连接，返回 (conn, 是否为复用连接)"""
+        while True:
+            with self._lock:
+                self._evict_expired(time.monotonic())
+                if not self._idle:
+                    break
+                # LIFO：优先复用最近归还的连接，让多余的连接自然空闲过期
+                conn, _ = self._idle.pop()
+            if self._is_healthy(conn):
+                return conn, True
+            conn.close()
+        return http.client.HTTPConnection(self.host, self.port, timeout=BACKEND_CONNECT_TIMEOUT), False
+
+    def release(self, conn, response=None):
+        """归还连接；响应体必须已完整读取，否则连接无法复用，直接关闭"""
+        reusable = conn.sock is not None and (response is None or response.isclosed())
+        if reusable:
+            with self._lock:
+                if len(self._idle) < self.max_size:
+                    self._idle.append((conn, time.monotonic()))
+                    return
+        conn.close()
+
+    def request(self, method, url, body=None, headers=None, timing=None, read_timeout=None):
+        """
+        发送请求，返回 (conn, response)
+        调用方读完响应体后必须调用 release(conn, response)
+        复用的连接已失效时换一个连接重试，但只限于请求体可重放（不是生成器），并且是 GET/HEAD
+        或者请求还没有完整发出：请求发出后连接才断开时，后端可能已经执行了写操作，重放会重复执行
+        timing（ProxyContext）不为空时记录 connect（含失败重试）和 ttfb 耗时
+        连接超时为 BACKEND_CONNECT_TIMEOUT，之后每次读写的超时为 read_timeout（默认 BACKEND_TIMEOUT）
+        """
+        replayable = body is None or isinstance(body, (bytes, bytearray))
+        started = time.perf_counter()
+        while True:
+            conn, reused = self.acquire()
+            sent = False
+            try:
+                if not reused:
+                    try:
+                        conn.connect()
+                    except TimeoutError:
+                        raise UpstreamConnectTimeout(
+                            f"connect to {self.host}:{self.port} timed out after {BACKEND_CONNECT_TIMEOUT} seconds") from None
+                conn.sock.settimeout(read_timeout or BACKEND_TIMEOUT)
+                connected = time.perf_counter()
+                conn.request(method, url, body=body, headers=headers or {})
+                sent = True
+                response = conn.getresponse()
+                if timing is not None:
+                    timing.connect = connected - started
+                    timing.ttfb = time.perf_counter() - connected
+                return conn, response
+            except self.STALE_ERRORS:
+                conn.close()
+                # 新建连接失败说明后端确实不可用；复用连接失败则是 keep-alive 竞态，重试
+                if not reused or not replayable or (sent and method not in IDEMPOTENT_METHODS):
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+
+    def warm(self, count):
+        """预先建立最多 count 个连接放入空闲池（--warmup），返回成功建立的数量；后端连不上时直接放弃"""
+        opened = []
+        for _ in range(min(count, self.max_size)):
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=BACKEND_CONNECT_TIMEOUT)
+            try:
+                conn.connect()
+            except OSError:
+                conn.close()
+                break
+            opened.append(conn)
+        for conn in opened:
+            self.release(conn)
+        return len(opened)
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+
+
+# 后端实例的选择策略与被动健康检查（后端地址可用 --backend 配置多个）
+UPSTREAM_BALANCE = 'least-outstanding'  # round-robin：轮询；least-outstanding：选在途请求最少的后端
+UPSTREAM_EJECT_FAILURES = 3             # 连续连接失败或超时达到该次数的后端暂时摘除
+UPSTREAM_HEALTH_PATH = '/api/health'    # 探测被摘除后端的接口，返回 2xx 即恢复
+UPSTREAM_HEALTH_INTERVAL = 2.0          # 探测间隔（秒）
+UPSTREAM_HEALTH_TIMEOUT = 2             # 探测请求超时（秒）
+UPSTREAM_RETRIES = 1                    # GET/HEAD 连接失败或超时后换其他后端重试的次数
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD'))
+
+# 后端熔断：最近 CIRCUIT_WINDOW 个请求中连接失败或超时的比例达到 CIRCUIT_FAILURE_RATE 时熔断，
+# 熔断期间直接返回 503，不再等待超时
+CIRCUIT_WINDOW = 20
+CIRCUIT_MIN_REQUESTS = 10        # 窗口内请求数不足时不熔断
+CIRCUIT_FAILURE_RATE = 0.5
+CIRCUIT_OPEN_SECONDS = 5         # 熔断持续时间（秒），之后进入半开状态
+CIRCUIT_HALF_OPEN_TRIALS = 3     # 半开状态放行的试探请求数，全部成功后恢复
+
+
+class UpstreamUnavailable(Exception):
+    """可选的后端都处于熔断状态"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"all backends are circuit-open, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    单个后端的熔断器（由 UpstreamGroup 持锁调用）
+    - closed：正常转发，统计最近 CIRCUIT_WINDOW 个请求的失败率
+    - open：直接拒绝，CIRCUIT_OPEN_SECONDS 秒后进入 half-open
+    - half-open：放行最多 CIRCUIT_HALF_OPEN_TRIALS 个试探请求，任何一个失败立即重新熔断，全部成功则恢复
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.results = collections.deque(maxlen=CIRCUIT_WINDOW)  # True 表示失败
+        self.changed_at = 0.0
+        self.trials = 0
+        self.successes = 0
+        self.trips = 0
+
+    def allow(self, now):
+        """是否放行一个请求；half-open 状态下放行即占用一个试探名额"""
+        if self.state == self.CLOSED:
+            return True
+        if now - self.changed_at >= CIRCUIT_OPEN_SECONDS:
+            # open 到期进入 half-open；试探请求迟迟没有结果（如被取消）时也重新开始一轮试探
+            self.state = self.HALF_OPEN
+            self.changed_at = now
+            self.trials = self.successes = 0
+        if self.state == self.OPEN or self.trials >= CIRCUIT_HALF_OPEN_TRIALS:
+            return False
+        self.trials += 1
+        return True
+
+    def retry_after(self, now):
+        """距离下一次放行的秒数（用于 Retry-After）"""
+        return max(1, math.ceil(self.changed_at + CIRCUIT_OPEN_SECONDS - now))
+
+    def record(self, failed, now):
+        """记录一次请求结果，状态改变时返回新状态"""
+        if self.state == self.HALF_OPEN:
+            if failed:
+                return self._trip(now)
+            self.successes += 1
+            if self.successes < CIRCUIT_HALF_OPEN_TRIALS:
+                return None
+            self.state = self.CLOSED
+            self.results.clear()
+            return self.CLOSED
+        if self.state == self.OPEN:
+            # 熔断之前发出的请求，结果不再计入
+            return None
+        self.results.append(failed)
+        if failed and len(self.results) >= CIRCUIT_MIN_REQUESTS and \
+                sum(self.results) >= CIRCUIT_FAILURE_RATE * len(self.results):
+            return self._trip(now)
+        return None
+
+    def _trip(self, now):
+        self.state = self.OPEN
+        self.changed_at = now
+        self.trips += 1
+        return self.OPEN
+
+
+class Upstream:
+    """一个后端实例：长连接池，以及由 UpstreamGroup 加锁维护的在途请求数和健康状态"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.name = f'{host}:{port}'
+        self.pool = UpstreamConnectionPool(host, port)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.healthy = True
+        self.breaker = CircuitBreaker()
+
+
+class UpstreamGroup:
+    """
+    后端实例组（线程安全，各引擎共用）
+    - 按 round-robin 或 least-outstanding 选择后端，跳过熔断中的后端，全部熔断时抛出 UpstreamUnavailable
+    - 被动健康检查：连续 UPSTREAM_EJECT_FAILURES 次连接失败或超时的后端被摘除，
+      后台线程定期请求 UPSTREAM_HEALTH_PATH，成功后恢复；全部被摘除时仍照常选择，不直接拒绝请求
+    - GET/HEAD 失败时换一个没有尝试过的后端重试
+    pre-fork 模式下每个 worker 各自维护健康状态
+    """
+
+    def __init__(self, addresses, balance=UPSTREAM_BALANCE):
+        self.balance = balance
+        self.upstreams = []
+        self._next = 0
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self.configure(addresses)
+
+    def configure(self, addresses):
+        """替换后端地址列表 [(host, port), ...]"""
+        self.close_all()
+        self.upstreams = [Upstream(host, port) for host, port in addresses]
+
+    def choose(self, exclude=()):
+        """选择一个后端并计入在途请求，请求结束后必须调用 finish"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [u for u in self.upstreams if u not in exclude] or self.upstreams
+            candidates = [u for u in candidates if u.healthy] or candidates
+            # 从轮转的起点开始，least-outstanding 在在途数相同的后端之间也能均匀分配
+            start = self._next % len(candidates)
+            self._next += 1
+            ordered = candidates[start:] + candidates[:start]
+            if self.balance != 'round-robin':
+                ordered.sort(key=lambda u: u.outstanding)
+            for upstream in ordered:
+                if upstream.breaker.allow(now):
+                    break
+            else:
+                raise UpstreamUnavailable(min(u.breaker.retry_after(now) for u in ordered))
+            upstream.outstanding += 1
+            upstream.requests += 1
+            return upstream
+
+    def finish(self, upstream):
+        with self._lock:
+            upstream.outstanding -= 1
+
+    def record(self, upstream, error=None):
+        """记录一次访问结果：error 为连接失败或超时的异常，None 表示已收到响应头"""
+        restored = ejected = False
+        with self._lock:
+            circuit = upstream.breaker.record(error is not None, time.monotonic())
+            if error is None:
+                upstream.consecutive_failures = 0
+                if not upstream.healthy:
+                    upstream.healthy = restored = True
+            else:
+                upstream.failures += 1
+                upstream.consecutive_failures += 1
+                if upstream.healthy and upstream.consecutive_failures >= UPSTREAM_EJECT_FAILURES:
+                    upstream.healthy = False
+                    upstream.ejections += 1
+                    ejected = True
+        if circuit == CircuitBreaker.OPEN:
+            logger.warning("后端 %s 连接失败或超时比例过高，熔断 %d 秒", upstream.name, CIRCUIT_OPEN_SECONDS)
+        elif circuit == CircuitBreaker.CLOSED:
+            logger.info("后端 %s 试探请求全部成功，结束熔断", upstream.name)
+        if restored:
+            logger.info("后端 %s 请求成功，恢复转发", upstream.name)
+        elif ejected:
+            logger.warning("后端 %s 连续 %d 次连接失败或超时，暂时摘除", upstream.name, upstream.consecutive_failures)
+            self._start_probe()
+
+    def retry_target(self, method, tried):
+        """
+        请求失败后选择重试的后端（tried 为已经失败的后端列表）
+        只重试 GET/HEAD；不应重试或其余后端都在熔断时返回 None，由调用方返回原来的错误
+        """
+        if method not in IDEMPOTENT_METHODS or len(tried) > UPSTREAM_RETRIES or len(tried) >= len(self.upstreams):
+            return None
+        try:
+            return self.choose(tried)
+        except UpstreamUnavailable:
+            return None
+
+    def request(self, method, url, body=None, headers=None, timing=None, read_timeout=None):
+        """
+        选择后端并发送请求，返回 (upstream, conn, response)
+        调用方读完响应体后必须调用 release(upstream, conn, response)
+        """
+        tried = []
+        upstream = self.choose()
+        while True:
+            try:
+                conn, response = upstream.pool.request(method, url, body=body, headers=headers, timing=timing,
+                                                       read_timeout=read_timeout)
+            except (OSError, http.client.HTTPException) as e:
+                self.finish(upstream)
+                self.record(upstream, e)
+                tried.append(upstream)
+                next_upstream = self.retry_target(method, tried)
+                if next_upstream is None:
+                    raise
+                logger.warning("%s %s - 后端 %s 失败: %s，换 %s 重试", method, url, upstream.name, e, next_upstream.name)
+                upstream = next_upstream
+                continue
+            except BaseException:
+                self.finish(upstream)
+                raise
+            self.record(upstream)
+            return upstream, conn, response
+
+    def release(self, upstream, conn, response=None):
+        upstream.pool.release(conn, response)
+        self.finish(upstream)
+
+    def _start_probe(self):
+        with self._lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='upstream-health', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        """探测线程：只在有后端被摘除时运行，全部恢复后退出"""
+        while True:
+            time.sleep(UPSTREAM_HEALTH_INTERVAL)
+            with self._lock:
+                ejected = [u for u in self.upstreams if not u.healthy]
+                if not ejected:
+                    self._probe_thread = None
+                    return
+            for upstream in ejected:
+                if self.probe(upstream):
+                    with self._lock:
+                        upstream.healthy = True
+                        upstream.consecutive_failures = 0
+                    logger.info("后端 %s 健康检查通过，恢复转发", upstream.name)
+
+    @staticmethod
+    def probe(upstream):
+        """请求 UPSTREAM_HEALTH_PATH，返回 2xx 视为健康"""
+        conn = http.client.HTTPConnection(upstream.host, upstream.port, timeout=UPSTREAM_HEALTH_TIMEOUT)
+        try:
+            conn.request('GET', UPSTREAM_HEALTH_PATH)
+            return 200 <= conn.getresponse().status < 300
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return [{'upstream': u.name, 'healthy': u.healthy, 'outstanding': u.outstanding, 'requests': u.requests,
+                     'failures': u.failures, 'ejections': u.ejections, 'circuit': u.breaker.state,
+                     'circuit_trips': u.breaker.trips} for u in self.upstreams]
+
+    def warm(self, count):
+        """为每个后端预先建立 count 个长连接，返回建立的总数"""
+        return sum(upstream.pool.warm(count) for upstream in self.upstreams)
+
+    def close_all(self):
+        for upstream in self.upstreams:
+            upstream.pool.close_all()
+
+
+# 所有代理请求共享的后端实例组
+UPSTREAMS = UpstreamGroup([(BACKEND_HOST, BACKEND_PORT)])
+
+
+def parse_backends(value):
+    """解析 --backend：逗号分隔的 HOST:PORT 列表，省略 HOST 时为 BACKEND_HOST"""
+    addresses = []
+    for item in value.split(','):
+        host, _, port = item.strip().rpartition(':')
+        addresses.append((host or BACKEND_HOST, int(port)))
+    return addresses
+
+
+# 后端准入控制：同时在途的后端请求数上限（0 表示不限制，可用 --max-upstream 修改）
+MAX_UPSTREAM_INFLIGHT = 0
+OVERLOAD_RETRY_AFTER = 1  # 过载时 503 响应的 Retry-After（秒）
+
+
+class UpstreamOverloaded(Exception):
+    """在途的后端请求已达上限"""
+
+
+class UpstreamAdmission:
+    """
+    后端请求准入控制（各引擎共用）
+    后端变慢时请求会在代理中堆积，达到上限后新请求立即以 503 失败，不排队等待，
+    代理自身的延迟和资源占用保持可预期
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.inflight = 0
+        self.peak = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """占用一个在途名额，已满时抛出 UpstreamOverloaded"""
+        with self._lock:
+            if self.limit and self.inflight >= self.limit:
+                self.rejected += 1
+                raise UpstreamOverloaded(f"{self.inflight} upstream requests in flight")
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {'inflight': self.inflight, 'limit': self.limit, 'peak': self.peak, 'rejected': self.rejected}
+
+
+UPSTREAM_ADMISSION = UpstreamAdmission(MAX_UPSTREAM_INFLIGHT)
+
+
+# ==================== 各服务器引擎共用的响应规则 ====================
+
+# 所有响应都附带的 CORS 头
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
+)
+
+# 运行状态接口（只对本机开放）：线程池队列深度与利用率、在途后端请求数等
+STATUS_PATH = '/__status'
+
+# 客户端长连接（HTTP/1.1 keep-alive）
+KEEPALIVE_TIMEOUT = 15         # 长连接上等待下一个请求的最长空闲时间（秒）
+KEEPALIVE_MAX_REQUESTS = 100   # 单个连接最多处理的请求数，达到后回复 Connection: close
+CLIENT_IO_TIMEOUT = 60         # 处理请求期间读写客户端的超时（秒），避免慢客户端长期占住线程
+
+# 静态资源扩展名（JS、CSS、图片、字体等），按最后一个 "." 之后的后缀查表
+STATIC_EXTENSIONS = frozenset(('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico',
+                               '.woff', '.woff2', '.ttf', '.eot'))
+
+
+def get_static_root():
+    """
+    静态文件根目录：--dist-dir 指定的目录，否则为 frontend/dist（构建后的前端文件）
+    目录不存在时也不退回项目根目录（否则 .git、数据库等文件都会进入清单并可被访问），清单为空
+    """
+    if STATIC_ROOT:
+        return STATIC_ROOT
+    return os.path.join(os.getcwd(), 'frontend', 'dist')
+
+
+def is_static_path(path):
+    """是否是静态资源请求（其余非 API 路径都按 SPA 路由返回 index.html）"""
+    if path.startswith('/assets/'):
+        return True
+    dot = path.rfind('.')
+    return dot >= 0 and path[dot:].lower() in STATIC_EXTENSIONS
+
+
+def is_local_client(ip):
+    """是否是本机发起的请求"""
+    return ip.startswith('127.') or ip.startswith('::ffff:127.') or ip == '::1'
+
+
+def request_has_body(headers):
+    """请求是否带有请求体；Content-Length 无法解析时也按有请求体处理（连接不能再复用）"""
+    if 'Transfer-Encoding' in headers:
+        return True
+    try:
+        return int(headers.get('Content-Length') or 0) > 0
+    except ValueError:
+        return True
+
+
+def server_status(**extra):
+    """运行状态接口返回的 JSON 内容，extra 为各引擎自己的指标"""
+    status = {'pid': os.getpid(), 'upstream': UPSTREAM_ADMISSION.stats(), 'upstreams': UPSTREAMS.stats(),
+              'static': STATIC_MANIFEST.stats()}
+    status.update(extra)
+    return json.dumps(status).encode()
+
+
+def cache_control_for(path, is_static):
+    """静态资源缓存策略，返回 Cache-Control 值；不需要时返回 None"""
+    if is_static:
+        # JS/CSS 带哈希的文件可以长期缓存（1年）
+        if '/assets/' in path:
+            return 'public, max-age=31536000, immutable'
+        # 其他静态资源缓存 1 天
+        return 'public, max-age=86400'
+    if path == '/index.html' or path == '/':
+        # HTML 文件不缓存，确保更新时能获取最新版本
+        return 'no-cache, must-revalidate'
+    return None
+
+
+def render_error_page(code, message, explain):
+    """生成 UTF-8 编码的错误页面（默认的 send_error 使用 latin-1 编码，无法处理中文）"""
+    error_content = f'''<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01//EN"
+    "http://www.w3.org/TR/html4/strict.dtd">
+<html>
+    <head>
+        <meta http-equiv="Content-Type" content="text/html;charset=utf-8">
+        <title>Error response</title>
+    </head>
+    <body>
+        <h1>Error response</h1>
+        <p>Error code: {code}</p>
+        <p>Message: {html.escape(message, quote=False)}</p>
+        <p>Error code explanation: {code} - {html.escape(explain, quote=False)}</p>
+    </body>
+</html>'''
+    return error_content.encode('utf-8', 'replace')
+
+
+# ==================== 静态资源内存缓存 ====================
+
+# brotli 为可选依赖，未安装时只提供 gzip 压缩副本
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_CACHE_MAX_BYTES = 64 * 1024 * 1024     # 缓存总内存上限（含压缩副本）
+STATIC_CACHE_MAX_FILE_SIZE = 4 * 1024 * 1024  # 超过该大小的文件不缓存，直接从磁盘发送
+COMPRESS_MIN_SIZE = 256                       # 小于该大小的内容不压缩
+# 压缩副本在缓存未命中时于请求路径上生成：brotli 默认质量 11 压缩 750KB 的 JS 约需 0.5 秒，5 只需约 10ms
+STATIC_GZIP_LEVEL = 6
+STATIC_BROTLI_QUALITY = 5
+
+# 值得压缩的内容类型（text/* 之外）；图片、字体（woff/woff2 已压缩）等不压缩
+COMPRESSIBLE_TYPES = frozenset((
+    'application/javascript', 'application/json', 'application/xml',
+    'application/manifest+json', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon',
+    'application/vnd.ms-fontobject', 'font/ttf', 'font/otf',
+))
+
+
+def is_compressible(content_type):
+    """根据 Content-Type 判断内容是否值得压缩"""
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return media_type.startswith('text/') or media_type in COMPRESSIBLE_TYPES
+
+
+def choose_encoding(accept_encoding, available):
+    """
+    按客户端的 Accept-Encoding（含 q 值）从 available 中选出最合适的编码
+    优先级：br > gzip > deflate；都不可接受时返回 None（不压缩）
+    """
+    if not accept_encoding or not available:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    for coding in ('br', 'gzip', 'deflate'):
+        if coding in available and accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def file_etag(st):
+    """与清单记录不一致（正在被改写）的文件的强 ETag：由 mtime 和大小生成，不需要读取文件内容"""
+    return '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+
+
+def etag_matches(if_none_match, etags):
+    """If-None-Match 判断，按 RFC 9110 使用弱比较（忽略 W/ 前缀）"""
+    if if_none_match.strip() == '*':
+        return True
+    etags = {tag[2:] if tag.startswith('W/') else tag for tag in etags}
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in etags:
+            return True
+    return False
+
+
+def not_modified_since(headers, mtime):
+    """与 SimpleHTTPRequestHandler 一致的 If-Modified-Since 判断"""
+    ims = headers.get('If-Modified-Since')
+    if not ims:
+        return False
+    try:
+        ims_time = email.utils.parsedate_to_datetime(ims)
+    except (TypeError, IndexError, OverflowError, ValueError):
+        return False
+    if ims_time is None or ims_time.tzinfo is None:
+        return False
+    return int(mtime) <= ims_time.timestamp()
+
+
+# resolve_range 的返回值：Range 无法满足（416）
+RANGE_NOT_SATISFIABLE = 'unsatisfiable'
+
+
+def resolve_range(headers, size, etag, last_modified):
+    """
+    解析单段 Range 请求（bytes=start-end / bytes=start- / bytes=-suffix），返回 (start, end)，end 含在内
+    - 没有 Range、If-Range 与当前版本不匹配、格式无法识别或多段 Range 时返回 None（发送完整内容）
+    - 起点超出文件大小时返回 RANGE_NOT_SATISFIABLE
+    """
+    range_header = headers.get('Range')
+    if not range_header:
+        return None
+    if_range = headers.get('If-Range')
+    if if_range is not None and if_range.strip() not in (etag, last_modified):
+        return None
+    unit, _, spec = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # 后缀形式：最后 N 个字节
+            suffix = int(last)
+            if suffix <= 0:
+                return RANGE_NOT_SATISFIABLE
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return RANGE_NOT_SATISFIABLE
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def is_not_modified(headers, etags, mtime):
+    """条件请求判断：有 If-None-Match 时只比较 ETag，否则再看 If-Modified-Since"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etags)
+    return not_modified_since(headers, mtime)
+
+
+class CachedAsset:
+    """缓存中的单个静态文件：原始内容、预计算的 ETag/Last-Modified 以及压缩副本"""
+
+    __slots__ = ('size', 'mtime_ns', 'body', 'etag', 'last_modified', 'content_type',
+                 'variants', 'memory')
+
+    def __init__(self, body, entry):
+        """entry 为文件在清单中的记录（ManifestEntry），ETag 直接使用清单中的内容哈希"""
+        self.size = entry.size
+        self.mtime_ns = entry.mtime_ns
+        self.body = body
+        self.etag = entry.etag
+        self.last_modified = entry.last_modified
+        content_type = self.content_type = entry.content_type
+        self.variants = {}
+        if len(body) >= COMPRESS_MIN_SIZE and is_compressible(content_type):
+            compressed = gzip.compress(body, compresslevel=STATIC_GZIP_LEVEL, mtime=0)
+            if len(compressed) < len(body):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=STATIC_BROTLI_QUALITY)
+                if len(compressed) < len(body):
+                    self.variants['br'] = compressed
+        self.memory = len(body) + sum(len(v) for v in self.variants.values())
+
+    def etag_for(self, encoding):
+        """不同编码是不同的表示，各自使用不同的强 ETag"""
+        if encoding is None:
+            return self.etag
+        return self.etag[:-1] + '-' + encoding + '"'
+
+    def is_not_modified(self, headers):
+        """客户端缓存是否仍然有效；客户端可能持有任一编码版本的 ETag"""
+        etags = [self.etag_for(encoding) for encoding in (None, *self.variants)]
+        return is_not_modified(headers, etags, self.mtime_ns / 1e9)
+
+    def not_modified_headers(self, encoding):
+        """304 响应头：只包含校验器和 Vary，不带实体头"""
+        headers = [('ETag', self.etag_for(encoding)), ('Last-Modified', self.last_modified)]
+        if self.variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+        return headers
+
+    def select(self, accept_encoding):
+        """按 Accept-Encoding 选择要发送的版本，返回 (body, 编码或 None)"""
+        encoding = choose_encoding(accept_encoding, self.variants)
+        if encoding is None:
+            return self.body, None
+        return self.variants[encoding], encoding
+
+    def headers_for(self, body, encoding):
+        """该版本对应的响应头（不含 CORS/缓存头）"""
+        headers = [('Content-Type', self.content_type),
+                   ('Content-Length', str(len(body))),
+                   ('Last-Modified', self.last_modified),
+                   ('ETag', self.etag_for(encoding))]
+        if encoding is not None:
+            headers.append(('Content-Encoding', encoding))
+        else:
+            headers.append(('Accept-Ranges', 'bytes'))
+        if self.variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+        return headers
+
+    def range_headers(self, start, end):
+        """206 部分内容的响应头（Range 只作用于未压缩的原始内容）"""
+        headers = [('Content-Type', self.content_type),
+                   ('Content-Length', str(end - start + 1)),
+                   ('Content-Range', f'bytes {start}-{end}/{self.size}'),
+                   ('Last-Modified', self.last_modified),
+                   ('ETag', self.etag),
+                   ('Accept-Ranges', 'bytes')]
+        if self.variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+        return headers
+
+
+class StaticAssetCache:
+    """
+    frontend/dist 静态文件的内存缓存（线程安全，按需加载）
+    - 按总内存上限做 LRU 淘汰
+    - 以静态文件清单（STATIC_MANIFEST）为准：缓存内容与清单记录的版本一致即命中，不再访问磁盘；
+      清单切换后文件版本变化的条目重新加载，已删除的文件由 prune 清除
+    """
+
+    def __init__(self, max_bytes=STATIC_CACHE_MAX_BYTES, max_file_size=STATIC_CACHE_MAX_FILE_SIZE):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self._entries = collections.OrderedDict()  # 文件路径 -> CachedAsset，末尾为最近使用
+        self._memory = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # 文件路径 -> 正在加载该文件的锁（同一文件的并发首次请求只读取、压缩一次）
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, manifest_entry):
+        """与清单版本一致的缓存条目，没有时返回 None（调用方需持有 _lock）"""
+        entry = self._entries.get(manifest_entry.fs_path)
+        if entry is not None and entry.mtime_ns == manifest_entry.mtime_ns and entry.etag == manifest_entry.etag:
+            self._entries.move_to_end(manifest_entry.fs_path)
+            return entry
+        return None
+
+    def get(self, manifest_entry):
+        """返回清单条目对应的 CachedAsset；文件太大不适合缓存、或磁盘上的文件已与清单不一致时返回 None"""
+        fs_path = manifest_entry.fs_path
+        with self._lock:
+            entry = self._lookup(manifest_entry)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            # 版本已变化的旧条目
+            old = self._entries.pop(fs_path, None)
+            if old is not None:
+                self._memory -= old.memory
+            if manifest_entry.size > self.max_file_size:
+                return None
+            load_lock = self._loading.setdefault(fs_path, threading.Lock())
+        with load_lock:
+            with self._lock:
+                # 等待期间其他线程已经加载完成
+                entry = self._lookup(manifest_entry)
+            if entry is not None:
+                return entry
+            try:
+                return self._load(manifest_entry)
+            finally:
+                with self._lock:
+                    if self._loading.get(fs_path) is load_lock:
+                        del self._loading[fs_path]
+
+    def _load(self, manifest_entry):
+        fs_path = manifest_entry.fs_path
+        try:
+            with open(fs_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                body = f.read()
+        except OSError:
+            return None
+        if not manifest_entry.matches(st) or len(body) != st.st_size:
+            # 文件在清单生成后被改写（新版本正在部署），等新清单生效后再缓存
+            return None
+        entry = CachedAsset(body, manifest_entry)
+        if entry.memory > self.max_bytes:
+            return entry
+        with self._lock:
+            old = self._entries.pop(fs_path, None)
+            if old is not None:
+                self._memory -= old.memory
+            self._entries[fs_path] = entry
+            self._memory += entry.memory
+            # LRU 淘汰：从最久未使用的一端开始移除
+            while self._memory > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory -= evicted.memory
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._memory = 0
+
+    def preload(self, manifest):
+        """
+        预先载入清单中的文件（--warmup），返回 (文件数, 字节数)
+        index.html 和它引用的资源优先，其余按路径顺序，超过内存上限的部分不再载入（避免 LRU 相互淘汰）
+        """
+        index_refs = manifest.index_references() or set()
+        order = sorted(manifest.entries, key=lambda key: (key != MANIFEST_INDEX, key not in index_refs, key))
+        files = 0
+        for key in order:
+            manifest_entry = manifest.entries[key]
+            with self._lock:
+                full = self._memory + manifest_entry.size > self.max_bytes
+            if full:
+                break
+            if self.get(manifest_entry) is not None:
+                files += 1
+        with self._lock:
+            return files, self._memory
+
+    def prune(self, manifest):
+        """清单切换后，移除不在新清单中（或版本已变化）的缓存条目"""
+        current = {(entry.fs_path, entry.mtime_ns, entry.etag) for entry in manifest.entries.values()}
+        with self._lock:
+            for fs_path, entry in list(self._entries.items()):
+                if (fs_path, entry.mtime_ns, entry.etag) not in current:
+                    del self._entries[fs_path]
+                    self._memory -= entry.memory
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'files': len(self._entries), 'memory': self._memory}
+
+
+# 两种引擎共享的静态文件缓存
+STATIC_CACHE = StaticAssetCache()
+
+
+# ==================== 静态文件清单（frontend/dist 热更新） ====================
+
+MANIFEST_POLL_INTERVAL = 1.0   # 检查 dist 目录是否变化的间隔（秒），--no-watch 时不检查
+MANIFEST_INDEX = '/index.html'
+MANIFEST_RETRY_AFTER = 2       # 磁盘上的文件已与清单不一致（新版本正在部署）时 503 响应的 Retry-After（秒）
+
+# index.html 中引用的本地资源（如 /assets/index-3f2a1c.js），新清单必须包含它们才会生效
+INDEX_REFERENCE = re.compile(rb'''(?:src|href)\s*=\s*["'](/(?!/)[^"'?#]+)''')
+
+
+def manifest_key(path):
+    """请求路径 -> 清单中的键：去掉查询串并解码，规范化后去掉 . 和 ..（与 translate_path 相同，防止目录穿越）"""
+    path = urllib.parse.unquote(urllib.parse.urlsplit(path).path, errors='surrogatepass')
+    parts = [part for part in posixpath.normpath(path).split('/') if part and part not in (os.curdir, os.pardir)]
+    return '/' + '/'.join(parts)
+
+
+def hash_file_etag(f):
+    """按内容计算强 ETag（与文件内容一一对应，多个 worker、重启前后都一致）"""
+    digest = hashlib.sha1()
+    for chunk in iter(functools.partial(f.read, STREAM_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return '"%s"' % digest.hexdigest()[:20]
+
+
+class ManifestEntry:
+    """清单中的单个文件：路径、大小、mtime、内容哈希（ETag）和 MIME 类型"""
+
+    __slots__ = ('fs_path', 'size', 'mtime_ns', 'etag', 'last_modified', 'content_type')
+
+    def __init__(self, fs_path, st, etag):
+        self.fs_path = fs_path
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.etag = etag
+        self.last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(fs_path)[0] or 'application/octet-stream'
+
+    @property
+    def mtime(self):
+        return self.mtime_ns / 1e9
+
+    def matches(self, st):
+        """磁盘上的文件是否仍是清单记录的版本"""
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+
+def scan_dist(root):
+    """遍历 dist 目录，返回 {清单键: (文件路径, stat)}；目录不存在时返回空字典，隐藏文件和目录（. 开头）不收录"""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for name in filenames:
+            if name.startswith('.'):
+                continue
+            fs_path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(fs_path)
+            except OSError:
+                continue  # 扫描期间被删除
+            if stat.S_ISREG(st.st_mode):
+                files['/' + os.path.relpath(fs_path, root).replace(os.sep, '/')] = (fs_path, st)
+    return files
+
+
+def dist_signature(files):
+    """目录内容的签名：所有文件的 (键, 大小, mtime)，任何文件增删改都会改变签名"""
+    return frozenset((key, st.st_size, st.st_mtime_ns) for key, (_, st) in files.items())
+
+
+class AssetManifest:
+    """
+    dist 目录某一时刻的快照，生成后不再修改：清单键 -> ManifestEntry
+    请求只在这里做字典查找，不再逐个请求访问文件系统
+    """
+
+    def __init__(self, root, entries, signature):
+        self.root = root
+        self.entries = entries
+        self.signature = signature
+        self.version = hashlib.sha1(repr(sorted(signature)).encode()).hexdigest()[:12]
+        self.loaded_at = time.time()
+
+    @classmethod
+    def build(cls, root, files, previous=None):
+        """
+        为 scan_dist 的结果生成清单；大小和 mtime 都没变的文件沿用上一版清单的记录（不重新计算哈希）
+        计算哈希期间文件被删除或改写时返回 None，等目录稳定后再试
+        """
+        entries = {}
+        for key, (fs_path, st) in files.items():
+            old = previous.entries.get(key) if previous is not None else None
+            if old is not None and old.fs_path == fs_path and old.matches(st):
+                entries[key] = old
+                continue
+            try:
+                with open(fs_path, 'rb') as f:
+                    etag = hash_file_etag(f)
+                    hashed = os.fstat(f.fileno())
+            except OSError:
+                return None
+            if hashed.st_size != st.st_size or hashed.st_mtime_ns != st.st_mtime_ns:
+                return None
+            entries[key] = ManifestEntry(fs_path, st, etag)
+        return cls(root, entries, dist_signature(files))
+
+    def index_references(self):
+        """index.html 引用的本地静态资源（JS、CSS、图片等；SPA 路由链接不算）的清单键；读取失败时返回 None"""
+        index = self.entries.get(MANIFEST_INDEX)
+        if index is None:
+            return None
+        try:
+            with open(index.fs_path, 'rb') as f:
+                html_body = f.read()
+        except OSError:
+            return None
+        references = {manifest_key(ref.decode('utf-8', 'replace')) for ref in INDEX_REFERENCE.findall(html_body)}
+        return {ref for ref in references if is_static_path(ref)}
+
+    def missing_references(self):
+        """index.html 引用但清单中不存在的资源；没有 index.html 时返回 [MANIFEST_INDEX]"""
+        references = self.index_references()
+        if references is None:
+            return [MANIFEST_INDEX]
+        return sorted(ref for ref in references if ref not in self.entries)
+
+    def stats(self):
+        return {'root': self.root, 'files': len(self.entries), 'version': self.version,
+                'loaded_at': email.utils.formatdate(self.loaded_at, usegmt=True)}
+
+
+class StaticManifest:
+    """
+    当前生效的 dist 清单（AssetManifest），替换是一次赋值，请求看到的要么是旧清单要么是新清单
+    后台线程每 MANIFEST_POLL_INTERVAL 秒扫描目录（mtime 轮询，不依赖 inotify）：
+    - 目录内容与上次扫描不同：构建可能还在写入，等下一次扫描
+    - 连续两次扫描一致且与当前清单不同：生成新清单，index.html 及其引用的资源都存在时切换，否则继续使用旧清单
+      （当前清单本身没有 index.html 时直接切换）
+    """
+
+    def __init__(self, poll_interval=MANIFEST_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.current = None
+        self.reloads = 0
+        self._rejected = None  # 检查过但不完整的目录签名，避免重复生成和告警
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def load(self, root):
+        """同步生成清单并立即生效（启动时调用），返回清单"""
+        with self._lock:
+            return self._load(root)
+
+    def _load(self, root):
+        manifest = AssetManifest.build(root, scan_dist(root))
+        while manifest is None:
+            # 目录正在被改写：稍后重新扫描
+            time.sleep(0.1)
+            manifest = AssetManifest.build(root, scan_dist(root))
+        self.current = manifest
+        return manifest
+
+    def get(self):
+        """当前清单；还没有加载过时（如未经 main 启动）按 get_static_root() 生成"""
+        manifest = self.current
+        if manifest is None:
+            with self._lock:
+                manifest = self.current or self._load(get_static_root())
+        return manifest
+
+    def lookup(self, key):
+        """O(1) 查找清单条目，不存在时返回 None"""
+        return self.get().entries.get(key)
+
+    def is_stale(self, manifest_entry, st):
+        """
+        打开的文件是否已与清单记录的版本不一致：新版本正在部署，新清单生效前不能混用新旧文件
+        --no-watch 时清单不会更新，始终按磁盘上的实际版本提供
+        """
+        return self.poll_interval > 0 and not manifest_entry.matches(st)
+
+    def start_watching(self):
+        """启动后台检查线程（每个进程一个，pre-fork 模式下由 worker 在 fork 之后各自启动）"""
+        if self.poll_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        root = self.get().root
+        if not os.path.isdir(root):
+            logger.warning("静态文件目录 %s 不存在，不检查更新（构建完成后需重启服务器）", root)
+            return
+        self._thread = threading.Thread(target=self._watch, name='manifest-watcher', daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        pending = None
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                pending = self.check(pending)
+            except Exception:
+                logger.exception("检查静态文件目录失败")
+
+    def check(self, pending=None):
+        """
+        扫描一次目录，返回本次的签名（作为下一次调用的 pending）
+        本次与 pending 相同，说明两次扫描之间没有写入，才尝试切换
+        """
+        current = self.get()
+        files = scan_dist(current.root)
+        signature = dist_signature(files)
+        if signature == current.signature or signature == self._rejected or signature != pending:
+            return signature
+        manifest = AssetManifest.build(current.root, files, current)
+        if manifest is None:
+            return None
+        missing = manifest.missing_references()
+        if missing and MANIFEST_INDEX in current.entries:
+            self._rejected = signature
+            logger.warning("静态文件目录不完整（缺少 %s），继续使用版本 %s", ', '.join(missing[:5]), current.version)
+            return signature
+        self.current = manifest
+        self.reloads += 1
+        STATIC_CACHE.prune(manifest)
+        logger.info("静态文件已更新：版本 %s -> %s，共 %d 个文件", current.version, manifest.version,
+                    len(manifest.entries))
+        return signature
+
+    def stats(self):
+        stats = self.get().stats()
+        stats['reloads'] = self.reloads
+        return stats
+
+
+# 所有引擎共享的静态文件清单
+STATIC_MANIFEST = StaticManifest()
+
+
+# ==================== /api/ 响应动态压缩 ====================
+
+PROXY_COMPRESS = True              # 按 Accept-Encoding 压缩后端响应（--no-api-compression 关闭）
+PROXY_COMPRESS_MIN_SIZE = 1024     # 已知长度小于该值的响应不压缩；长度未知（chunked）的响应总是压缩
+PROXY_COMPRESS_LEVEL = 5           # gzip/deflate 压缩级别：动态压缩在压缩率和 CPU 之间折中
+PROXY_BROTLI_QUALITY = 4           # brotli 质量，同上
+
+# 压缩的后端响应类型（白名单）
+PROXY_COMPRESS_TYPES = frozenset((
+    'application/json', 'application/problem+json', 'text/plain', 'text/csv', 'text/html',
+))
+PROXY_ENCODINGS = ('br', 'gzip', 'deflate') if brotli is not None else ('gzip', 'deflate')
+
+
+def make_compressor(encoding):
+    """
+    返回增量压缩函数 (compress, finish)：compress(data) 处理一块数据，finish() 输出剩余数据
+    两者都可能返回空字节串；内存占用与响应大小无关
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=PROXY_BROTLI_QUALITY)
+        return (lambda data: compressor.process(bytes(data))), compressor.finish
+    # gzip 带 gzip 头（wbits 31）；HTTP 的 deflate 指 zlib 格式（wbits 15）
+    compressor = zlib.compressobj(PROXY_COMPRESS_LEVEL, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    return compressor.compress, compressor.flush
+
+
+def proxy_compressible(method, status, headers):
+    """
+    后端响应是否适合在代理中压缩
+    headers 需支持按小写头名 get（HTTPMessage 不区分大小写；也可以是小写键的 dict）
+    """
+    if not PROXY_COMPRESS or method == 'HEAD' or status < 200 or status in (204, 206, 304):
+        return False
+    # 已经编码过的响应（如后端自己压缩了）原样转发
+    if headers.get('content-encoding', 'identity').strip().lower() != 'identity':
+        return False
+    if 'no-transform' in headers.get('cache-control', '').lower():
+        return False
+    if headers.get('content-type', '').split(';', 1)[0].strip().lower() not in PROXY_COMPRESS_TYPES:
+        return False
+    length = headers.get('content-length')
+    return length is None or not length.isdigit() or int(length) >= PROXY_COMPRESS_MIN_SIZE
+
+
+def apply_proxy_compression(response_headers, encoding):
+    """
+    调整可压缩响应的响应头列表（原地修改）
+    - 总是追加 Vary: Accept-Encoding：同一 URL 的表示取决于 Accept-Encoding
+    - encoding 不为 None 时：去掉 Content-Length（改用 chunked 或关闭连接分帧），
+      强 ETag 改为弱 ETag（压缩后字节不同；后端对 If-None-Match 按弱比较处理，304 仍然有效），
+      加上 Content-Encoding
+    """
+    for i, (name, value) in enumerate(response_headers):
+        if name.lower() == 'vary':
+            if 'accept-encoding' not in value.lower() and value.strip() != '*':
+                response_headers[i] = (name, value + ', Accept-Encoding')
+            break
+    else:
+        response_headers.append(('Vary', 'Accept-Encoding'))
+    if encoding is None:
+        return
+    for i in range(len(response_headers) - 1, -1, -1):
+        name, value = response_headers[i]
+        lower = name.lower()
+        if lower == 'content-length':
+            del response_headers[i]
+        elif lower == 'etag' and not value.startswith('W/'):
+            response_headers[i] = (name, 'W/' + value)
+    response_headers.append(('Content-Encoding', encoding))
+
+
+# ==================== /api/ GET 短期缓存与请求合并 ====================
+
+# 默认关闭，通过 --api-cache 开启
+# 只缓存下表中轮询频繁的只读接口（路径不含查询参数 -> 缓存秒数）
+API_CACHE_TTLS = {
+    '/api/parent/dashboard': 2.0,
+    '/api/child/dashboard': 2.0,
+    '/api/parent/stats': 5.0,
+    '/api/child/lottery/info': 5.0,
+    '/api/child/all-achievements': 10.0,
+}
+API_CACHE_MAX_ENTRIES = 1024            # 最多缓存的响应数（LRU 淘汰）
+API_CACHE_MAX_ENTRY_SIZE = 512 * 1024   # 超过该大小的响应不缓存
+
+# 缓存响应时不保存的头（逐跳头和每次重新生成的头）
+API_CACHE_SKIP_HEADERS = frozenset(('connection', 'keep-alive', 'transfer-encoding', 'content-length', 'date', 'server'))
+
+
+@functools.lru_cache(maxsize=1024)
+def token_scope(authorization):
+    """
+    从 Authorization 中的 JWT 取出 familyId，作为缓存失效的范围（同一家庭的数据互相关联）
+    只用于分组，不校验签名；缓存键本身包含完整的 Authorization，不会串号
+    解析失败时返回 None
+    """
+    token = authorization[7:] if authorization.lower().startswith('bearer ') else authorization
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return str(claims['familyId'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def api_route_family(path):
+    """路由前缀（如 /api/parent/tasks/3 -> /api/parent）：写请求无法识别家庭时，按它清除缓存"""
+    return '/'.join(path.split('?', 1)[0].split('/', 3)[:3])
+
+
+class CachedApiResponse:
+    """缓存的 API 响应（只缓存 200）"""
+
+    __slots__ = ('headers', 'body', 'etag', 'scope', 'expires', 'compressible', 'variants')
+
+    def __init__(self, headers, body, scope, ttl):
+        self.headers = [(k, v) for k, v in headers if k.lower() not in API_CACHE_SKIP_HEADERS]
+        self.body = body
+        self.etag = next((v for k, v in headers if k.lower() == 'etag'), None)
+        self.scope = scope
+        self.expires = time.monotonic() + ttl
+        self.compressible = proxy_compressible('GET', 200, {k.lower(): v for k, v in headers})
+        self.variants = {}  # 编码 -> 压缩后的响应体，第一次命中时生成
+
+    def select(self, accept_encoding):
+        """按 Accept-Encoding 返回要发送的 (响应体, 响应头)，不含 Content-Length"""
+        if not self.compressible:
+            return self.body, self.headers
+        encoding = choose_encoding(accept_encoding, PROXY_ENCODINGS)
+        body = self.body
+        if encoding is not None:
+            body = self.variants.get(encoding)
+            if body is None:
+                compress, finish = make_compressor(encoding)
+                body = self.variants[encoding] = compress(self.body) + finish()
+        headers = list(self.headers)
+        apply_proxy_compression(headers, encoding)
+        return body, headers
+
+
+class _InFlight:
+    """正在向后端请求中的缓存键；相同请求的其他线程/协程等待它的结果"""
+
+    __slots__ = ('scope', 'family', 'generation', 'result', '_event', '_lock', '_futures')
+
+    def __init__(self, scope, family, generation):
+        self.scope = scope
+        self.family = family
+        self.generation = generation
+        self.result = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def wait(self, timeout):
+        """线程引擎中等待结果；返回 CachedApiResponse，结果不可缓存或超时返回 None"""
+        self._event.wait(timeout)
+        return self.result
+
+    async def wait_async(self, timeout):
+        """asyncio 引擎中等待结果，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._event.is_set():
+                return self.result
+            self._futures.append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def set(self, result):
+        with self._lock:
+            self.result = result
+            self._event.set()
+            futures, self._futures = self._futures, []
+        for loop, future in futures:
+            loop.call_soon_threadsafe(_set_future_result, future, result)
+
+
+def _set_future_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+class ApiResponseCache:
+    """
+    /api/ 只读接口的短期响应缓存（线程安全）
+    - 键为 路径+查询参数+Authorization，按 API_CACHE_TTLS 中的路由设置过期时间
+    - 相同键的并发请求只有第一个（leader）访问后端，其余等待它的结果（single-flight）
+    - 同一家庭的任何 POST/PUT/PATCH/DELETE 都会清除该家庭的缓存；
+      无法识别家庭（没有 Authorization 或其中没有 familyId）时，清除同一路由前缀下所有用户的缓存
+    """
+
+    def __init__(self, ttls=API_CACHE_TTLS, max_entries=API_CACHE_MAX_ENTRIES,
+                 max_entry_size=API_CACHE_MAX_ENTRY_SIZE):
+        self.enabled = False
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.max_entry_size = max_entry_size
+        self._entries = collections.OrderedDict()  # 键 -> CachedApiResponse，末尾为最近使用
+        self._inflight = {}
+        # 丢弃失效前发出的请求结果：每次失效 _clock 加一，_invalidated 记录家庭 ID 或路由前缀最近一次失效时的 _clock
+        self._clock = 0
+        self._invalidated = {}
+        self._lock = threading.Lock()
+
+    def cache_key(self, path, headers):
+        """返回请求的缓存键；未开启或该路由不缓存时返回 None"""
+        if not self.enabled or path.split('?', 1)[0] not in self.ttls:
+            return None
+        return path, headers.get('Authorization', '')
+
+    def get(self, key):
+        """取未过期的缓存响应"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def begin(self, key):
+        """请求合并：返回 (flight, 是否为 leader)；leader 完成后必须调用 finish()"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                return flight, False
+            scope = token_scope(key[1]) if key[1] else None
+            flight = _InFlight(scope, api_route_family(key[0]), self._clock)
+            self._inflight[key] = flight
+            return flight, True
+
+    def finish(self, key, flight, status=None, headers=None, body=None):
+        """
+        leader 结束请求：200 且大小合适的响应存入缓存，并交给等待中的请求
+        不可缓存（或中途出错）时不传响应，等待者会自行访问后端
+        """
+        entry = None
+        if status == 200 and body is not None and len(body) <= self.max_entry_size:
+            entry = CachedApiResponse(headers, body, flight.scope, self.ttls[key[0].split('?', 1)[0]])
+        with self._lock:
+            self._inflight.pop(key, None)
+            # 请求期间发生过写操作，结果可能已过时，不缓存也不分享
+            if entry is not None and self._invalidated_since(flight):
+                entry = None
+            if entry is not None:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        flight.set(entry)
+        return entry
+
+    def _invalidated_since(self, flight):
+        """请求发出之后，它所属的家庭或路由前缀是否被写操作清除过（调用方需持有锁）"""
+        return max(self._invalidated.get(flight.scope, 0), self._invalidated.get(flight.family, 0)) > flight.generation
+
+    def invalidate(self, path, headers):
+        """写请求（POST/PUT/PATCH/DELETE）后清除同一家庭的缓存；无法识别家庭时清除同一路由前缀的缓存"""
+        if not self.enabled:
+            return
+        authorization = headers.get('Authorization')
+        scope = token_scope(authorization) if authorization else None
+        with self._lock:
+            self._clock += 1
+            if scope is not None:
+                self._invalidated[scope] = self._clock
+                stale = [key for key, entry in self._entries.items() if entry.scope == scope]
+            else:
+                family = api_route_family(path)
+                self._invalidated[family] = self._clock
+                stale = [key for key in self._entries if api_route_family(key[0]) == family]
+            for key in stale:
+                del self._entries[key]
+            if len(self._invalidated) > self.max_entries:
+                # 早于所有进行中请求的失效记录不会再用到（之后发出的请求都晚于它）
+                oldest = min((flight.generation for flight in self._inflight.values()), default=self._clock)
+                self._invalidated = {k: v for k, v in self._invalidated.items() if v > oldest}
+
+
+# 两种引擎共享的 API 响应缓存
+API_CACHE = ApiResponseCache()
+
+
+# ==================== /api/ 代理流程（两种引擎共用的规则） ====================
+
+# 不向后端转发的头：逐跳头，以及由代理重新计算的 Content-Length
+# Expect 由代理自己回复 100 Continue，转发时请求体已经在手，不需要后端再确认
+SKIP_REQUEST_HEADERS = frozenset(('host', 'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer',
+                                  'upgrade', 'content-length', 'expect'))
+# 带 JSON 请求体的方法还要跳过 Content-Type，统一设置为 application/json
+SKIP_JSON_REQUEST_HEADERS = SKIP_REQUEST_HEADERS | {'content-type'}
+# 不向客户端回传的后端响应头：逐跳头，以及代理发送响应时自己会加上的 Server/Date（避免重复）
+SKIP_RESPONSE_HEADERS = frozenset(('connection', 'keep-alive', 'transfer-encoding', 'server', 'date'))
+
+# 可代理的方法：json_body 表示请求体统一按 JSON 转发，mutating 表示是写操作
+ProxyMethod = collections.namedtuple('ProxyMethod', 'json_body mutating')
+PROXY_METHODS = {
+    'GET': ProxyMethod(json_body=False, mutating=False),
+    'HEAD': ProxyMethod(json_body=False, mutating=False),
+    'DELETE': ProxyMethod(json_body=False, mutating=True),
+    'POST': ProxyMethod(json_body=True, mutating=True),
+    'PUT': ProxyMethod(json_body=True, mutating=True),
+    'PATCH': ProxyMethod(json_body=True, mutating=True),
+}
+
+
+class ProxyContext:
+    """
+    一次代理请求的状态，传给各个钩子
+    pre_request 钩子可以修改 upstream_headers；post_response 钩子可以读取 status/error/elapsed
+    connect/ttfb/transfer 为访问后端各阶段的耗时（秒，time.perf_counter），没有访问后端时 ttfb 为 None
+    read_timeout 为该路由的后端响应超时（见 ROUTE_TIMEOUTS）
+    """
+
+    __slots__ = ('method', 'path', 'client_headers', 'upstream_headers', 'status', 'error', 'start', 'elapsed',
+                 'connect', 'ttfb', 'transfer', 'read_timeout')
+
+    def __init__(self, method, path, client_headers):
+        self.method = method
+        self.path = path
+        self.client_headers = client_headers
+        self.upstream_headers = {}
+        self.status = None
+        self.error = None
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        self.connect = 0.0
+        self.ttfb = None
+        self.transfer = None
+        self.read_timeout = ROUTE_TIMEOUTS.get(path.split('?', 1)[0], BACKEND_TIMEOUT)
+
+
+# 代理钩子：stage -> [hook(ctx)]；钩子在请求线程（或事件循环）中同步执行，必须足够快
+PROXY_HOOKS = {'pre_request': [], 'post_response': []}
+
+
+def add_proxy_hook(stage, hook):
+    """注册代理钩子，stage 为 'pre_request' 或 'post_response'"""
+    PROXY_HOOKS[stage].append(hook)
+
+
+def run_proxy_hooks(stage, ctx):
+    """依次执行钩子；post_response 钩子出错只记录，不影响已经发出的响应"""
+    for hook in PROXY_HOOKS[stage]:
+        if stage == 'pre_request':
+            hook(ctx)
+            continue
+        try:
+            hook(ctx)
+        except Exception as e:
+            logger.error("代理钩子 %s 执行失败: %s", getattr(hook, '__name__', hook), e)
+
+
+def build_upstream_headers(method, client_headers, body_headers):
+    """构建发往后端的请求头：过滤逐跳头，带请求体时使用代理计算的长度头（Host 按选中的后端设置）"""
+    json_body = PROXY_METHODS[method].json_body
+    skip = SKIP_JSON_REQUEST_HEADERS if json_body else SKIP_REQUEST_HEADERS
+    headers = {key: value for key, value in client_headers.items() if key.lower() not in skip}
+    if json_body:
+        headers['Content-Type'] = 'application/json'
+    headers.update(body_headers)
+    return headers
+
+
+def classify_proxy_error(error, read_timeout=None):
+    """把访问后端时的异常映射为 (状态码, 日志说明, 错误信息)：超时为 504，其余为 502"""
+    error_msg = str(error)
+    read_timeout = read_timeout or BACKEND_TIMEOUT
+    if isinstance(error, UpstreamConnectTimeout):
+        return 504, "连接后端超时", f"Backend timeout: Could not connect to backend server within {BACKEND_CONNECT_TIMEOUT} seconds"
+    # asyncio 只在 asyncio 引擎中导入（Python 3.11 起 asyncio.TimeoutError 就是内置的 TimeoutError）
+    async_timeout = getattr(sys.modules.get('asyncio'), 'TimeoutError', TimeoutError)
+    if isinstance(error, (socket.timeout, TimeoutError, async_timeout)) or 'timeout' in error_msg.lower():
+        return 504, "后端超时", f"Backend timeout: Request to backend server timed out after {read_timeout} seconds"
+    return 502, f"连接错误: {error_msg}", f"Backend connection error: {error_msg}"
+
+
+def invalidate_api_cache_hook(ctx):
+    """写操作（即使失败或超时，后端也可能已经执行）后清除同一家庭的 API 缓存"""
+    if PROXY_METHODS[ctx.method].mutating:
+        API_CACHE.invalidate(ctx.path, ctx.client_headers)
+
+
+add_proxy_hook('post_response', invalidate_api_cache_hook)
+
+
+# ==================== 性能分析（--profile DIR） ====================
+
+PROFILE_DUMP_INTERVAL = 30   # 定期写出分析结果的间隔（秒），进程退出时也会写一次
+PROFILE_TOP = 40             # 文本报告中列出的函数/代码行数
+TRACEMALLOC_FRAMES = 10      # tracemalloc 记录的调用栈深度
+
+
+class RequestProfiler:
+    """
+    请求处理热路径的 cProfile + tracemalloc 分析（开销明显，只在排查性能问题时开启；相关模块用到时才导入）
+    - 线程引擎：每个连接一个 cProfile.Profile，只在处理请求期间启用（不含等待下一个请求），连接结束时合并
+    - asyncio 引擎：事件循环线程上持续启用，定期合并
+    - 每 PROFILE_DUMP_INTERVAL 秒和退出时写出（pid 区分 pre-fork 的各个 worker）：
+      profile-<pid>.prof（pstats 格式）、profile-<pid>.txt（按累计耗时排序）、
+      tracemalloc-<pid>.snapshot（tracemalloc.Snapshot.load 读取）、tracemalloc-<pid>.txt（按代码行统计的内存分配）
+    """
+
+    def __init__(self, out_dir, interval=PROFILE_DUMP_INTERVAL):
+        self.out_dir = out_dir
+        self.interval = interval
+        self._stats = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """开始记录内存分配并启动定期写出线程（pre-fork 模式下由 worker 在 fork 之后各自调用）"""
+        # 先导入分析要用的模块，它们的导入不计入内存分配统计，也不拖慢第一次合并
+        import cProfile, pstats, tracemalloc
+        os.makedirs(self.out_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._dump_loop, name='profiler', daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def new_profile():
+        """新建一个 cProfile.Profile"""
+        import cProfile
+        return cProfile.Profile()
+
+    def collect(self, profile):
+        """合并一个已经停止的 cProfile.Profile"""
+        import pstats
+        with self._lock:
+            try:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+            except TypeError:
+                pass  # 没有记录到任何调用
+
+    def _dump_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.dump()
+            except Exception:
+                logger.exception("写出性能分析结果失败")
+
+    def dump(self):
+        """写出目前为止的分析结果"""
+        import tracemalloc
+        pid = os.getpid()
+        path = functools.partial(os.path.join, self.out_dir)
+        with self._lock:
+            if self._stats is not None:
+                self._stats.dump_stats(path(f'profile-{pid}.prof'))
+                with open(path(f'profile-{pid}.txt'), 'w', encoding='utf-8') as f:
+                    self._stats.stream = f
+                    self._stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+            snapshot.dump(path(f'tracemalloc-{pid}.snapshot'))
+            current, peak = tracemalloc.get_traced_memory()
+            with open(path(f'tracemalloc-{pid}.txt'), 'w', encoding='utf-8') as f:
+                f.write(f'traced memory: current={current} peak={peak}\n')
+                for line in snapshot.statistics('lineno')[:PROFILE_TOP]:
+                    f.write(f'{line}\n')
+
+
+# --profile 时为 RequestProfiler，默认不分析
+PROFILER = None
+
+
+# ==================== 运行指标（/__metrics） ====================
+
+# Prometheus 文本格式的指标接口（只对本机开放）
+METRICS_PATH = '/__metrics'
+# 请求耗时直方图的分桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 最多区分的 (方法, 路由) 组合数，超出后归入 route="other"，防止异常路径撑爆内存
+METRICS_MAX_ROUTES = 512
+
+# 路径中的 ID 段：纯数字、UUID、MongoDB ObjectId 等
+_ROUTE_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27}|[0-9a-fA-F]{24,})$')
+_METRIC_METHODS = frozenset(PROXY_METHODS) | {'OPTIONS'}
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_api_route(path):
+    return '/'.join(':id' if _ROUTE_ID_SEGMENT.match(part) else part for part in path.split('/'))
+
+
+def normalize_route(path):
+    """
+    指标使用的路由标签：/api/ 路径把 ID 段替换为 :id（如 /api/parent/tasks/:id），
+    静态资源统一为 static，SPA 路由统一为 spa
+    """
+    path = path.split('?', 1)[0]
+    if path.startswith('/api/'):
+        return _normalize_api_route(path)
+    if path in (STATUS_PATH, METRICS_PATH):
+        return path
+    return 'static' if is_static_path(path) else 'spa'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    return ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+
+
+class Metrics:
+    """
+    进程内指标（线程安全）
+    每个请求结束时只加一次锁，把状态码、耗时、流量一次性记入；
+    直方图按桶计数，输出时再累加为 Prometheus 要求的累计值
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, max_routes=METRICS_MAX_ROUTES):
+        self.buckets = buckets
+        self.max_routes = max_routes
+        self._lock = threading.Lock()
+        self._requests = collections.Counter()         # (方法, 路由, 状态码) -> 次数
+        self._latency = {}                              # (方法, 路由) -> [各桶次数..., +Inf 次数, 总耗时]
+        self._bytes_in = collections.Counter()          # (方法, 路由) -> 字节数
+        self._bytes_out = collections.Counter()
+        self._upstream_errors = collections.Counter()   # (方法, 路由, 类型) -> 次数
+        self._active_connections = 0
+
+    def _route_key(self, method, path):
+        """调用方需持有锁"""
+        key = (method if method in _METRIC_METHODS else 'OTHER', normalize_route(path))
+        if key not in self._latency and len(self._latency) >= self.max_routes:
+            key = (key[0], 'other')
+        return key
+
+    def observe_request(self, method, path, status, duration, bytes_in, bytes_out):
+        bucket = bisect.bisect_left(self.buckets, duration)
+        with self._lock:
+            key = self._route_key(method, path)
+            self._requests[key + (status,)] += 1
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bucket] += 1
+            histogram[-1] += duration
+            self._bytes_in[key] += bytes_in
+            self._bytes_out[key] += bytes_out
+
+    def upstream_error(self, method, path, kind):
+        """kind：error（502）、timeout（504）或 overloaded（503，在途请求已达上限）"""
+        with self._lock:
+            self._upstream_errors[self._route_key(method, path) + (kind,)] += 1
+
+    def connection_opened(self):
+        with self._lock:
+            self._active_connections += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self._active_connections -= 1
+
+    def render(self, pool_stats=None):
+        """输出 Prometheus 文本格式（version 0.0.4）"""
+        with self._lock:
+            requests = dict(self._requests)
+            latency = {key: list(values) for key, values in self._latency.items()}
+            bytes_in = dict(self._bytes_in)
+            bytes_out = dict(self._bytes_out)
+            upstream_errors = dict(self._upstream_errors)
+            active_connections = self._active_connections
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+
+        route_labels = ('method', 'route')
+        metric('http_requests_total', 'counter', 'Requests by method, route and status code.',
+               [(_format_labels(route_labels + ('status',), key), count) for key, count in sorted(requests.items())])
+
+        lines.append('# HELP http_request_duration_seconds Request latency by method and route.')
+        lines.append('# TYPE http_request_duration_seconds histogram')
+        for key, histogram in sorted(latency.items()):
+            labels = _format_labels(route_labels, key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), histogram):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram[-1]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        metric('http_request_bytes_total', 'counter', 'Bytes received from clients (headers and body).',
+               [(_format_labels(route_labels, key), count) for key, count in sorted(bytes_in.items())])
+        metric('http_response_bytes_total', 'counter', 'Bytes sent to clients (headers and body).',
+               [(_format_labels(route_labels, key), count) for key, count in sorted(bytes_out.items())])
+        metric('http_upstream_errors_total', 'counter',
+               'Proxy requests that failed upstream (error=502, timeout=504, overloaded/circuit_open=503).',
+               [(_format_labels(route_labels + ('kind',), key), count)
+                for key, count in sorted(upstream_errors.items())])
+        metric('http_active_connections', 'gauge', 'Open client connections.', [('', active_connections)])
+
+        upstream = UPSTREAM_ADMISSION.stats()
+        metric('http_upstream_inflight_requests', 'gauge', 'Backend requests in flight.', [('', upstream['inflight'])])
+        metric('http_upstream_rejected_total', 'counter', 'Requests rejected by --max-upstream.',
+               [('', upstream['rejected'])])
+
+        backends = UPSTREAMS.stats()
+        for name, kind, field, help_text in (
+                ('backend_healthy', 'gauge', 'healthy', '1 if the backend is in rotation, 0 if ejected.'),
+                ('backend_outstanding_requests', 'gauge', 'outstanding', 'Requests in flight per backend.'),
+                ('backend_requests_total', 'counter', 'requests', 'Requests sent per backend (including retries).'),
+                ('backend_failures_total', 'counter', 'failures', 'Connection errors and timeouts per backend.'),
+                ('backend_ejections_total', 'counter', 'ejections', 'Times the backend was ejected.'),
+                ('backend_circuit_trips_total', 'counter', 'circuit_trips', 'Times the circuit breaker opened.')):
+            metric(name, kind, help_text,
+                   [(_format_labels(('backend',), (b['upstream'],)), int(b[field])) for b in backends])
+        metric('backend_circuit_state', 'gauge', 'Circuit breaker state (0=closed, 1=half-open, 2=open).',
+               [(_format_labels(('backend',), (b['upstream'],)), CIRCUIT_STATE_VALUES[b['circuit']])
+                for b in backends])
+
+        cache = STATIC_CACHE.stats()
+        lookups = cache['hits'] + cache['misses']
+        metric('static_cache_hits_total', 'counter', 'Static asset cache hits.', [('', cache['hits'])])
+        metric('static_cache_misses_total', 'counter', 'Static asset cache misses.', [('', cache['misses'])])
+        metric('static_cache_hit_ratio', 'gauge', 'Static asset cache hit ratio.',
+               [('', round(cache['hits'] / lookups, 4) if lookups else 0)])
+        metric('static_cache_memory_bytes', 'gauge', 'Memory used by cached static assets.',
+               [('', cache['memory'])])
+
+        if pool_stats is not None:
+            metric('thread_pool_busy_threads', 'gauge', 'Busy threads in the pool engine.', [('', pool_stats['busy'])])
+            metric('thread_pool_utilization', 'gauge', 'Busy threads / pool size.', [('', pool_stats['utilization'])])
+            metric('thread_pool_queue_depth', 'gauge', 'Connections waiting for a pool thread.',
+                   [('', pool_stats['queue_depth'])])
+            metric('thread_pool_rejected_total', 'counter', 'Connections rejected because the queue was full.',
+                   [('', pool_stats['rejected'])])
+        return ('\n'.join(lines) + '\n').encode()
+
+
+METRICS = Metrics()
+CIRCUIT_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics_proxy_hook(ctx):
+    """统计访问后端失败的代理请求（502/504 分支，以及准入控制返回的 503）"""
+    if ctx.error is None:
+        return
+    if isinstance(ctx.error, UpstreamOverloaded):
+        METRICS.upstream_error(ctx.method, ctx.path, 'overloaded')
+    elif isinstance(ctx.error, UpstreamUnavailable):
+        METRICS.upstream_error(ctx.method, ctx.path, 'circuit_open')
+    elif ctx.status in (502, 504):
+        METRICS.upstream_error(ctx.method, ctx.path, 'timeout' if ctx.status == 504 else 'error')
+
+
+add_proxy_hook('post_response', metrics_proxy_hook)
+
+
+class CountingWriter:
+    """包装处理器的 wfile，统计写给客户端的字节数"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def write(self, data):
+        n = self.raw.write(data)
+        self.count += n
+        return n
+
+    def flush(self):
+        self.raw.flush()
+
+    def close(self):
+        self.raw.close()
+
+    @property
+    def closed(self):
+        return self.raw.closed
+
+
+class CountingReader:
+    """包装处理器的 rfile，统计从客户端读到的字节数"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.count += len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.raw.readline(size)
+        self.count += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n = self.raw.readinto(buffer)
+        self.count += n or 0
+        return n
+
+    def close(self):
+        self.raw.close()
+
+    @property
+    def closed(self):
+        return self.raw.closed
+
+class KeepAliveTracker:
+    """
+    线程引擎中正在等待下一个请求的客户端长连接
+    空闲的长连接也占着一个处理线程：线程池排满或 worker 停止时，对这些连接 shutdown(SHUT_RD)，
+    阻塞在读取请求行上的处理线程立即读到 EOF，结束连接并释放线程
+    """
+
+    def __init__(self):
+        self.stopping = False
+        self._idle = {}  # socket -> 是否已经处理过请求（刚建立、还没收到第一个请求的连接为 False）
+        self._lock = threading.Lock()
+
+    def enter_idle(self, sock, reused):
+        """连接开始等待下一个请求；已经在停止时返回 False，调用方应直接关闭连接"""
+        with self._lock:
+            if self.stopping and reused:
+                return False
+            self._idle[sock] = reused
+            return True
+
+    def leave_idle(self, sock):
+        with self._lock:
+            self._idle.pop(sock, None)
+
+    def close_idle(self, stop=False):
+        """
+        关闭空闲长连接
+        - stop=False：只关闭处理过请求的连接（刚建立的连接请求通常已在路上）
+        - stop=True：关闭全部空闲连接，之后的响应都带 Connection: close
+        """
+        with self._lock:
+            if stop:
+                self.stopping = True
+            idle = [sock for sock, reused in self._idle.items() if stop or reused]
+            for sock in idle:
+                del self._idle[sock]
+        for sock in idle:
+            try:
+                sock.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+
 class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
     """自定义HTTP请求处理器"""
     
+    # 支持长连接：每个响应都带 Content-Length 或使用 chunked 编码，无法确定长度时才关闭连接
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，长连接上第二次写会被 Nagle 算法扣住，等客户端的延迟确认（约 40ms）
+    disable_nagle_algorithm = True
+    
     def __init__(self, *args, **kwargs):
-        import time
-        self._request_start_time = time.time()
-        # 优先使用 frontend/dist 目录（构建后的前端文件）
-        dist_dir = os.path.join(os.getcwd(), 'frontend', 'dist')
-        if os.path.exists(dist_dir):
-            super().__init__(*args, directory=dist_dir, **kwargs)
-        else:
-            # 如果 dist 目录不存在，使用当前目录
-            super().__init__(*args, directory=os.getcwd(), **kwargs)
+        super().__init__(*args, directory=STATIC_MANIFEST.get().root, **kwargs)
+    
+    def setup(self):
+        """包装 rfile/wfile 以统计收发字节数，并计入活动连接数"""
+        super().setup()
+        self.rfile = CountingReader(self.rfile)
+        self.wfile = CountingWriter(self.wfile)
+        self._requests_handled = 0
+        self._keepalive = getattr(self.server, 'keepalive', None)
+        self._profile = None
+        METRICS.connection_opened()
+    
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            METRICS.connection_closed()
+            if self._profile is not None:
+                self._profile.disable()
+                PROFILER.collect(self._profile)
+    
+    def parse_request(self):
+        """每个请求（包括同一连接上的后续请求）开始时记录时间；收到请求行后改用读写超时"""
+        self._request_start = time.perf_counter()
+        self._awaiting_request = False
+        if PROFILER is not None:
+            # --profile：从收到请求行开始统计，到访问日志写出为止
+            if self._profile is None:
+                self._profile = PROFILER.new_profile()
+            self._profile.enable()
+        if self._keepalive is not None:
+            self._keepalive.leave_idle(self.connection)
+        self.connection.settimeout(CLIENT_IO_TIMEOUT)
+        ok = super().parse_request()
+        self._request_path = self.path
+        if ok:
+            self._body_pending = request_has_body(self.headers)
+        return ok
+    
+    def handle_one_request(self):
+        """
+        处理一个请求，响应体全部发出后再记录访问日志（包含完整耗时）
+        长连接上等待下一个请求时使用空闲超时（服务器的 keepalive_timeout，默认 KEEPALIVE_TIMEOUT）；
+        请求体没有被读完的连接无法定位下一个请求的开始，响应后关闭
+        """
+        self._request_start = time.perf_counter()
+        self._response_status = None
+        self._request_path = None
+        self._proxy_ctx = None
+        self._is_static_resource = False
+        # 请求头解析成功之前无法确定请求边界，请求行过长、请求头错误（414/400/431 等）时响应后关闭连接
+        self._body_pending = True
+        self._awaiting_request = True
+        self.connection.settimeout(getattr(self.server, 'keepalive_timeout', KEEPALIVE_TIMEOUT))
+        if self._keepalive is not None and not self._keepalive.enter_idle(self.connection, self._requests_handled > 0):
+            self.close_connection = True
+            return
+        bytes_in, bytes_out = self.rfile.count, self.wfile.count
+        try:
+            super().handle_one_request()
+        finally:
+            if self._keepalive is not None:
+                self._keepalive.leave_idle(self.connection)
+        if self._body_pending:
+            self.close_connection = True
+        if self._response_status is not None:
+            self._requests_handled += 1
+            method, path, status = self.command or '-', self._request_path or '-', int(self._response_status)
+            elapsed = time.perf_counter() - self._request_start
+            log_access(self.client_address[0], method, path, status, elapsed, self._proxy_ctx)
+            METRICS.observe_request(method, path, status, elapsed,
+                                    self.rfile.count - bytes_in, self.wfile.count - bytes_out)
+        if self._profile is not None:
+            self._profile.disable()
     
-    def send_error(self, code, message=None, explain=None):
+    def send_error(self, code, message=None, explain=None, headers=()):
         """
         重写 send_error 方法，正确处理中文字符编码
         默认的 send_error 使用 latin-1 编码，无法处理中文
+        headers 为额外的响应头（如 503 的 Retry-After）
         """
-        import html
-        
         try:
             short_msg, long_msg = self.responses.get(code, ('???', '???'))
         except AttributeError:
@@ -51,363 +2187,1833 @@ class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
         self.log_error("code %d, message %s", code, message)
         
         # 使用 UTF-8 编码的错误页面
-        error_content = f'''<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01//EN"
-    "http://www.w3.org/TR/html4/strict.dtd">
-<html>
-    <head>
-        <meta http-equiv="Content-Type" content="text/html;charset=utf-8">
-        <title>Error response</title>
-    </head>
-    <body>
-        <h1>Error response</h1>
-        <p>Error code: {code}</p>
-        <p>Message: {html.escape(message, quote=False)}</p>
-        <p>Error code explanation: {code} - {html.escape(explain, quote=False)}</p>
-    </body>
-</html>'''
-        
-        # 使用 UTF-8 编码
-        body = error_content.encode('utf-8', 'replace')
+        body = render_error_page(code, message, explain)
         
         # HTTP 状态行不能包含非 ASCII 字符，只发送状态码
         self.send_response(code)
         self.send_header("Content-Type", "text/html;charset=utf-8")
         self.send_header('Content-Length', str(len(body)))
+        for header, value in headers:
+            self.send_header(header, value)
         self.end_headers()
         
         if self.command != 'HEAD' and code >= 200 and code not in (204, 304):
             self.wfile.write(body)
     
     def do_GET(self):
-        """处理GET请求"""
-        import time
-        self._request_start_time = time.time()
-        
-        # API 请求转发到后端服务器
+        """处理GET请求：/api/ 转发到后端，其余为静态文件和 SPA 路由"""
         if self.path.startswith('/api/'):
-            import urllib.request
-            import http.client
-            
-            print(f"[请求] GET {self.path} - 开始处理")
-            try:
-                backend_url = f'http://localhost:3001{self.path}'
-                
-                # 构建安全的请求头 - 过滤掉不应该转发的头
-                skip_headers = ['host', 'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade']
-                safe_headers = {}
-                for key, value in self.headers.items():
-                    if key.lower() not in skip_headers:
-                        safe_headers[key] = value
-                safe_headers['Host'] = 'localhost:3001'
-                
-                req = urllib.request.Request(backend_url, headers=safe_headers)
-                
-                # 处理 304 Not Modified 响应
-                # 添加超时设置，避免请求挂起（10秒超时）
-                try:
-                    response = urllib.request.urlopen(req, timeout=10)
-                    status_code = response.getcode()
-                    
-                    # 如果是 304，直接返回 304，不读取响应体
-                    if status_code == 304:
-                        self.send_response(304)
-                        for header, value in response.headers.items():
-                            if header.lower() not in ['connection', 'transfer-encoding', 'content-length']:
-                                self.send_header(header, value)
-                        self.end_headers()
-                        return
-                    
-                    # 其他状态码，正常处理
-                    self.send_response(status_code)
-                    for header, value in response.headers.items():
-                        if header.lower() not in ['connection', 'transfer-encoding']:
-                            self.send_header(header, value)
-                    self.end_headers()
-                    self.wfile.write(response.read())
-                except urllib.error.HTTPError as e:
-                    # 处理 HTTP 错误（包括 304）
-                    if e.code == 304:
-                        self.send_response(304)
-                        for header, value in e.headers.items():
-                            if header.lower() not in ['connection', 'transfer-encoding', 'content-length']:
-                                self.send_header(header, value)
-                        self.end_headers()
-                    else:
-                        self.send_response(e.code)
-                        for header, value in e.headers.items():
-                            if header.lower() not in ['connection', 'transfer-encoding']:
-                                self.send_header(header, value)
-                        self.end_headers()
-                        self.wfile.write(e.read())
-                except (urllib.error.URLError, socket.timeout, TimeoutError) as e:
-                    # 处理网络错误和超时
-                    elapsed = time.time() - self._request_start_time
-                    error_msg = str(e)
-                    if 'timeout' in error_msg.lower() or isinstance(e, (socket.timeout, TimeoutError)):
-                        print(f"[错误] GET {self.path} - 后端超时 ({elapsed:.3f}s)")
-                        self.send_error(504, f"Backend timeout: Request to backend server timed out after 10 seconds")
-                    else:
-                        print(f"[错误] GET {self.path} - 连接错误: {error_msg} ({elapsed:.3f}s)")
-                        self.send_error(502, f"Backend connection error: {error_msg}")
-            except Exception as e:
-                elapsed = time.time() - self._request_start_time
-                error_msg = str(e)
-                if 'timeout' in error_msg.lower():
-                    print(f"[错误] GET {self.path} - 超时异常: {error_msg} ({elapsed:.3f}s)")
-                    self.send_error(504, f"Backend timeout: {error_msg}")
-                else:
-                    print(f"[错误] GET {self.path} - 代理错误: {error_msg} ({elapsed:.3f}s)")
-                    self.send_error(502, f"Backend proxy error: {error_msg}")
-            else:
-                elapsed = time.time() - self._request_start_time
-                print(f"[成功] GET {self.path} - 完成 ({elapsed:.3f}s)")
-            return
-        
+            return self._proxy()
+        if self.path == STATUS_PATH and is_local_client(self.client_address[0]):
+            return self._send_status()
+        if self.path == METRICS_PATH and is_local_client(self.client_address[0]):
+            return self._send_metrics()
+        self._serve_static()
+    
+    def do_HEAD(self):
+        """处理HEAD请求 - 与 GET 相同的路由，只是不发送响应体"""
+        if self.path.startswith('/api/'):
+            return self._proxy()
+        self._serve_static()
+    
+    def _send_status(self):
+        """运行状态（JSON）；线程池引擎额外报告队列深度和线程利用率"""
+        pool_stats = getattr(self.server, 'pool_stats', None)
+        body = server_status(pool=pool_stats()) if pool_stats else server_status()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_metrics(self):
+        """Prometheus 文本格式的运行指标"""
+        pool_stats = getattr(self.server, 'pool_stats', None)
+        body = METRICS.render(pool_stats() if pool_stats else None)
+        self.send_response(200)
+        self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _serve_static(self):
+        """静态资源与 SPA 路由（GET/HEAD 共用）"""
         # 检查是否是静态资源请求（JS、CSS、图片等）
-        static_extensions = ['.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.woff2', '.ttf', '.eot']
-        is_static_resource = any(self.path.lower().endswith(ext) for ext in static_extensions) or self.path.startswith('/assets/')
+        is_static_resource = is_static_path(self.path)
         
         # 标记为静态资源请求，以便在 end_headers 中添加缓存头
         self._is_static_resource = is_static_resource
         
-        # 如果是静态资源，尝试返回文件
-        if is_static_resource:
-            return super().do_GET()
-        
         # 对于所有其他路径（SPA 路由），返回 index.html
         # 这样 React Router 可以在客户端处理路由
-        self.path = '/index.html'
-        return super().do_GET()
-    
-    def do_POST(self):
-        """处理POST请求 - 转发到后端API"""
-        import time
-        self._request_start_time = time.time()
+        if not is_static_resource:
+            self.path = '/index.html'
         
-        # API 请求转发到后端服务器
-        if self.path.startswith('/api/'):
-            import urllib.request
-            import json
-            
-            print(f"[请求] POST {self.path} - 开始处理")
-            try:
-                # 读取请求体
-                content_length = int(self.headers.get('Content-Length', 0))
-                post_data = self.rfile.read(content_length) if content_length > 0 else b''
-                
-                # 转发到后端 - 过滤掉不应该转发的头
-                backend_url = f'http://localhost:3001{self.path}'
-                
-                # 构建安全的请求头 - 确保 Content-Type 正确传递
-                skip_headers = ['host', 'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade', 'content-length', 'content-type']
-                safe_headers = {
-                    'Host': 'localhost:3001',
-                    'Content-Type': 'application/json',
-                    'Content-Length': str(len(post_data))
-                }
-                # 复制其他安全的头
-                for key, value in self.headers.items():
-                    if key.lower() not in skip_headers:
-                        safe_headers[key] = value
-                
-                print(f"[调试] POST 请求体长度: {len(post_data)}, Content-Type: {safe_headers['Content-Type']}")
-                
-                req = urllib.request.Request(backend_url, data=post_data, headers=safe_headers)
-                
-                # 添加超时设置（10秒）
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    self.send_response(response.getcode())
-                    for header, value in response.headers.items():
-                        if header.lower() not in ['connection', 'transfer-encoding']:
-                            self.send_header(header, value)
-                    self.end_headers()
-                    self.wfile.write(response.read())
-            except (urllib.error.URLError, socket.timeout, TimeoutError) as e:
-                elapsed = time.time() - self._request_start_time
-                error_msg = str(e)
-                if 'timeout' in error_msg.lower() or isinstance(e, (socket.timeout, TimeoutError)):
-                    print(f"[错误] POST {self.path} - 后端超时 ({elapsed:.3f}s)")
-                    self.send_error(504, f"Backend timeout: Request timed out after 10 seconds")
-                else:
-                    print(f"[错误] POST {self.path} - 连接错误: {error_msg} ({elapsed:.3f}s)")
-                    self.send_error(502, f"Backend connection error: {error_msg}")
-            except Exception as e:
-                elapsed = time.time() - self._request_start_time
-                error_msg = str(e)
-                if 'timeout' in error_msg.lower():
-                    print(f"[错误] POST {self.path} - 超时异常: {error_msg} ({elapsed:.3f}s)")
-                    self.send_error(504, f"Backend timeout: {error_msg}")
-                else:
-                    print(f"[错误] POST {self.path} - 代理错误: {error_msg} ({elapsed:.3f}s)")
-                    self.send_error(502, f"Backend proxy error: {error_msg}")
-            else:
-                elapsed = time.time() - self._request_start_time
-                print(f"[成功] POST {self.path} - 完成 ({elapsed:.3f}s)")
+        # 在静态文件清单中查找（不访问文件系统），清单中没有的文件直接 404
+        manifest_entry = STATIC_MANIFEST.lookup(manifest_key(self.path))
+        if manifest_entry is None:
+            self.send_error(404, "File not found")
+            return
+        # 优先从内存缓存返回，不适合缓存的文件（如大文件）再走磁盘
+        entry = STATIC_CACHE.get(manifest_entry)
+        if entry is not None:
+            self._send_cached_file(entry)
         else:
-            self.send_error(404, "Not Found")
+            self._send_disk_file(manifest_entry)
     
-    def do_PUT(self):
-        """处理PUT请求 - 转发到后端API"""
-        import time
-        self._request_start_time = time.time()
+    def _send_cached_file(self, entry):
+        """从 STATIC_CACHE 发送文件，客户端缓存仍有效时返回 304"""
+        body, encoding = entry.select(self.headers.get('Accept-Encoding'))
+        if entry.is_not_modified(self.headers):
+            self.send_response(304)
+            for header, value in entry.not_modified_headers(encoding):
+                self.send_header(header, value)
+            self.end_headers()
+            return
+        
+        byte_range = resolve_range(self.headers, entry.size, entry.etag, entry.last_modified)
+        if byte_range == RANGE_NOT_SATISFIABLE:
+            self._send_range_not_satisfiable(entry.size)
+            return
+        if byte_range is not None:
+            start, end = byte_range
+            self.send_response(206)
+            for header, value in entry.range_headers(start, end):
+                self.send_header(header, value)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(memoryview(entry.body)[start:end + 1])
+            return
         
-        # API 请求转发到后端服务器
+        self.send_response(200)
+        for header, value in entry.headers_for(body, encoding):
+            self.send_header(header, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def _send_disk_file(self, manifest_entry):
+        """
+        直接从磁盘发送不适合缓存的文件，支持 ETag/304 和 Range（206）
+        文件内容通过 socket.sendfile 发送，支持的平台上由内核零拷贝完成
+        部署过程中文件已被改写时返回 503，等新清单生效后按新版本提供（--no-watch 时按磁盘上的实际版本）
+        """
+        try:
+            f = open(manifest_entry.fs_path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if STATIC_MANIFEST.is_stale(manifest_entry, st):
+                # 503 不能带上静态资源的长期缓存头
+                self._is_static_resource = False
+                self.send_error(503, "Deploy in progress, please retry later",
+                                headers=[('Retry-After', str(MANIFEST_RETRY_AFTER))])
+                return
+            etag = manifest_entry.etag if manifest_entry.matches(st) else file_etag(st)
+            last_modified = self.date_time_string(st.st_mtime)
+            if is_not_modified(self.headers, (etag,), st.st_mtime):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                return
+            
+            byte_range = resolve_range(self.headers, st.st_size, etag, last_modified)
+            if byte_range == RANGE_NOT_SATISFIABLE:
+                self._send_range_not_satisfiable(st.st_size)
+                return
+            start, end = byte_range or (0, st.st_size - 1)
+            length = end - start + 1
+            
+            self.send_response(206 if byte_range else 200)
+            self.send_header('Content-Type', manifest_entry.content_type)
+            self.send_header('Content-Length', str(length))
+            if byte_range:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{st.st_size}')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            if self.command != 'HEAD' and length > 0:
+                # wfile 不带缓冲，响应头已全部写出，可以直接在套接字上 sendfile
+                self.wfile.count += self.connection.sendfile(f, start, length)
+    
+    def _send_range_not_satisfiable(self, size):
+        """Range 起点超出文件大小：416，并告知完整长度"""
+        self.send_response(416)
+        self.send_header('Content-Range', f'bytes */{size}')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def _proxy_or_404(self):
+        """处理POST/PUT/PATCH/DELETE请求 - 只有 /api/ 路径转发到后端"""
         if self.path.startswith('/api/'):
-            import urllib.request
+            return self._proxy()
+        self.send_error(404, "Not Found")
+    
+    do_POST = do_PUT = do_PATCH = do_DELETE = _proxy_or_404
+    
+    def _proxy(self):
+        """
+        所有 /api/ 请求的统一代理流程（方法规则见 PROXY_METHODS）
+        读取请求体 -> pre_request 钩子 -> 连接池转发 -> 流式回传 -> post_response 钩子
+        """
+        method = self.command
+        ctx = self._proxy_ctx = ProxyContext(method, self.path, self.headers)
+        logger.debug("%s %s - 开始处理", method, self.path)
+        try:
+            # 读取请求体（大请求体以生成器形式流式转发）
+            body, body_headers = self._read_request_body()
+            if body is None and PROXY_METHODS[method].json_body:
+                # 没有请求体的 POST/PUT/PATCH 也明确告诉后端长度为 0
+                body, body_headers = b'', {'Content-Length': '0'}
+            ctx.upstream_headers = build_upstream_headers(method, self.headers, body_headers)
+            run_proxy_hooks('pre_request', ctx)
+            if PROXY_METHODS[method].json_body:
+                logger.debug("%s 请求体长度: %s, Content-Type: %s", method,
+                             ctx.upstream_headers.get('Content-Length', 'chunked'), ctx.upstream_headers['Content-Type'])
             
-            print(f"[请求] PUT {self.path} - 开始处理")
+            # 开启 --api-cache 时，轮询频繁的只读接口走短期缓存
+            cache_key = API_CACHE.cache_key(self.path, self.headers) if method == 'GET' else None
+            if cache_key is None or not self._proxy_cached_get(ctx, cache_key):
+                # 选择后端并通过其连接池转发（连接超时 BACKEND_CONNECT_TIMEOUT，响应超时见 ROUTE_TIMEOUTS）
+                with UPSTREAM_ADMISSION.slot():
+                    upstream, conn, response = UPSTREAMS.request(method, self.path, body=body,
+                                                                 headers=ctx.upstream_headers, timing=ctx,
+                                                                 read_timeout=ctx.read_timeout)
+                    try:
+                        # 所有状态码（包括 304 和 4xx/5xx）原样流式返回
+                        ctx.status = response.status
+                        transfer_start = time.perf_counter()
+                        self._relay_response(response)
+                        ctx.transfer = time.perf_counter() - transfer_start
+                    finally:
+                        UPSTREAMS.release(upstream, conn, response)
+        except UpstreamOverloaded as e:
+            # 在途后端请求已达上限：立即失败，让客户端稍后重试
+            ctx.error = e
+            ctx.status = 503
+            logger.warning("%s %s - 后端请求已达上限 %d，返回 503", method, self.path, UPSTREAM_ADMISSION.limit)
+            self.send_error(503, "Upstream overloaded, please retry later",
+                            headers=[('Retry-After', str(OVERLOAD_RETRY_AFTER))])
+        except UpstreamUnavailable as e:
+            # 后端处于熔断状态：不等待超时，立即失败
+            ctx.error = e
+            ctx.status = 503
+            logger.warning("%s %s - 后端熔断中，返回 503", method, self.path)
+            self.send_error(503, "Backend unavailable, please retry later",
+                            headers=[('Retry-After', str(e.retry_after))])
+        except ClientBodyError as e:
+            # 客户端的问题（不计入后端健康检查和熔断）：请求体没有读完，返回 400 后关闭连接
+            ctx.error = e
+            ctx.status = 400
+            self._body_pending = True
+            logger.warning("%s %s - 读取请求体失败: %s", method, self.path, e)
+            with contextlib.suppress(OSError):
+                self.send_error(400, "Bad request body")
+        except (OSError, http.client.HTTPException) as e:
+            # 处理网络错误和超时
+            ctx.error = e
+            code, log_msg, error_msg = classify_proxy_error(e, ctx.read_timeout)
+            ctx.status = code
+            logger.error("%s %s - %s (%.3fs)", method, self.path, log_msg, time.perf_counter() - ctx.start)
+            self.send_error(code, error_msg)
+        except Exception as e:
+            ctx.error = e
+            ctx.status = 502
+            logger.error("%s %s - 代理错误: %s (%.3fs)", method, self.path, e, time.perf_counter() - ctx.start)
+            self.send_error(502, f"Backend proxy error: {e}")
+        finally:
+            ctx.elapsed = time.perf_counter() - ctx.start
+            run_proxy_hooks('post_response', ctx)
+    
+    def _proxy_cached_get(self, ctx, cache_key):
+        """
+        带短期缓存和请求合并的 GET 代理，返回 True 表示已经响应（实际发出的状态码记录在 ctx.status）
+        返回 False 表示等待的 leader 没有拿到可缓存的结果，由调用方按普通代理处理
+        """
+        entry = API_CACHE.get(cache_key)
+        if entry is not None:
+            ctx.status = self._send_api_response(entry, 'HIT')
+            return True
+        
+        flight, leader = API_CACHE.begin(cache_key)
+        if not leader:
+            # 相同请求正在访问后端，等待它的结果
+            entry = flight.wait(ctx.read_timeout)
+            if entry is None:
+                return False
+            ctx.status = self._send_api_response(entry, 'HIT')
+            return True
+        
+        # leader：去掉条件请求头，拿到完整的 200 响应才能缓存
+        upstream_headers = {k: v for k, v in ctx.upstream_headers.items()
+                            if k.lower() not in ('if-none-match', 'if-modified-since')}
+        status = headers = body = None
+        try:
+            with UPSTREAM_ADMISSION.slot():
+                upstream, conn, response = UPSTREAMS.request('GET', self.path, headers=upstream_headers, timing=ctx,
+                                                             read_timeout=ctx.read_timeout)
+                try:
+                    transfer_start = time.perf_counter()
+                    length = response.getheader('Content-Length')
+                    if response.status != 200 or length is None or int(length) > API_CACHE.max_entry_size:
+                        # 不可缓存：先让等待者自行访问后端，再按普通方式流式转发
+                        API_CACHE.finish(cache_key, flight)
+                        flight = None
+                        ctx.status = response.status
+                        self._relay_response(response)
+                        ctx.transfer = time.perf_counter() - transfer_start
+                        return True
+                    status, headers, body = response.status, response.getheaders(), response.read()
+                    ctx.transfer = time.perf_counter() - transfer_start
+                finally:
+                    UPSTREAMS.release(upstream, conn, response)
+        finally:
+            if flight is not None:
+                entry = API_CACHE.finish(cache_key, flight, status, headers, body)
+        if entry is None:
+            # 请求期间发生了写操作，结果不进入缓存，但仍返回给本次请求
+            entry = CachedApiResponse(headers, body, None, 0)
+        ctx.status = self._send_api_response(entry, 'MISS')
+        return True
+    
+    def _send_api_response(self, entry, cache_status):
+        """发送缓存的 API 响应，返回发出的状态码；客户端 ETag 仍然有效时返回 304"""
+        if_none_match = self.headers.get('If-None-Match')
+        if entry.etag and if_none_match and etag_matches(if_none_match, (entry.etag,)):
+            self.send_response(304)
+            self.send_header('ETag', entry.etag)
+            self.send_header('X-Cache', cache_status)
+            self.end_headers()
+            return 304
+        body, headers = entry.select(self.headers.get('Accept-Encoding'))
+        self.send_response(200)
+        for header, value in headers:
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Cache', cache_status)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        return 200
+    
+    def _read_request_body(self):
+        """
+        读取客户端请求体，返回 (body, 需要转发的长度头)；没有请求体时返回 (None, {})
+        - 不超过一个分块的请求体直接读入内存，连接失效时可以重试
+        - 更大的请求体返回生成器，边读边发，内存占用不超过 STREAM_CHUNK_SIZE
+        - 客户端使用 chunked 编码时，返回生成器且不带长度头，由 http.client 重新按 chunked 发送
+        """
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            return self._iter_chunked_body(), {}
+        
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            raise ClientBodyError("Invalid Content-Length") from None
+        if content_length <= 0:
+            return None, {}
+        if content_length <= STREAM_CHUNK_SIZE:
             try:
-                # 读取请求体
-                content_length = int(self.headers.get('Content-Length', 0))
-                put_data = self.rfile.read(content_length) if content_length > 0 else b''
-                
-                # 转发到后端 - 过滤掉不应该转发的头
-                backend_url = f'http://localhost:3001{self.path}'
-                
-                # 构建安全的请求头
-                skip_headers = ['host', 'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade', 'content-length', 'content-type']
-                safe_headers = {
-                    'Host': 'localhost:3001',
-                    'Content-Type': 'application/json',
-                    'Content-Length': str(len(put_data))
-                }
-                for key, value in self.headers.items():
-                    if key.lower() not in skip_headers:
-                        safe_headers[key] = value
-                
-                print(f"[调试] PUT 请求体长度: {len(put_data)}, Content-Type: {safe_headers['Content-Type']}")
-                
-                # 关键修复：显式设置 method='PUT'
-                req = urllib.request.Request(backend_url, data=put_data, headers=safe_headers, method='PUT')
-                
-                # 添加超时设置（10秒）
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    self.send_response(response.getcode())
-                    for header, value in response.headers.items():
-                        if header.lower() not in ['connection', 'transfer-encoding']:
-                            self.send_header(header, value)
-                    self.end_headers()
-                    self.wfile.write(response.read())
-            except (urllib.error.URLError, socket.timeout, TimeoutError) as e:
-                elapsed = time.time() - self._request_start_time
-                error_msg = str(e)
-                if 'timeout' in error_msg.lower() or isinstance(e, (socket.timeout, TimeoutError)):
-                    print(f"[错误] PUT {self.path} - 后端超时 ({elapsed:.3f}s)")
-                    self.send_error(504, f"Backend timeout: Request timed out after 10 seconds")
-                else:
-                    print(f"[错误] PUT {self.path} - 连接错误: {error_msg} ({elapsed:.3f}s)")
-                    self.send_error(502, f"Backend connection error: {error_msg}")
-            except urllib.error.HTTPError as e:
-                # 处理后端返回的 HTTP 错误
-                elapsed = time.time() - self._request_start_time
-                print(f"[错误] PUT {self.path} - 后端返回 {e.code} ({elapsed:.3f}s)")
-                self.send_response(e.code)
-                for header, value in e.headers.items():
-                    if header.lower() not in ['connection', 'transfer-encoding']:
-                        self.send_header(header, value)
-                self.end_headers()
-                self.wfile.write(e.read())
-            except Exception as e:
-                elapsed = time.time() - self._request_start_time
-                error_msg = str(e)
-                print(f"[错误] PUT {self.path} - 代理错误: {error_msg} ({elapsed:.3f}s)")
-                self.send_error(502, f"Backend proxy error: {error_msg}")
-            else:
-                elapsed = time.time() - self._request_start_time
-                print(f"[成功] PUT {self.path} - 完成 ({elapsed:.3f}s)")
-        else:
-            self.send_error(404, "Not Found")
+                body = self.rfile.read(content_length)
+            except OSError as e:
+                raise ClientBodyError(f"Failed to read request body: {e}") from e
+            if len(body) < content_length:
+                raise ClientBodyError("Client closed connection while sending request body")
+            self._body_pending = False
+            return body, {'Content-Length': str(content_length)}
+        return self._iter_fixed_body(content_length), {'Content-Length': str(content_length)}
+    
+    def _read_exact_into(self, view):
+        """把 rfile 中的数据填满 view，客户端提前断开或超时时抛出 ClientBodyError"""
+        filled = 0
+        while filled < len(view):
+            try:
+                n = self.rfile.readinto(view[filled:])
+            except OSError as e:
+                raise ClientBodyError(f"Failed to read request body: {e}") from e
+            if not n:
+                raise ClientBodyError("Client closed connection while sending request body")
+            filled += n
+    
+    def _read_body_line(self):
+        """读取 chunked 请求体中的一行（分块大小、分块结尾或 trailer）"""
+        try:
+            line = self.rfile.readline(1024)
+        except OSError as e:
+            raise ClientBodyError(f"Failed to read chunked body: {e}") from e
+        if not line:
+            raise ClientBodyError("Client closed connection while sending chunked body")
+        return line
+    
+    def _iter_fixed_body(self, remaining):
+        """按分块读取定长请求体（每次产出的 memoryview 在下一次迭代前有效）"""
+        view = get_stream_buffer()
+        while remaining > 0:
+            chunk = view[:min(remaining, len(view))]
+            self._read_exact_into(chunk)
+            remaining -= len(chunk)
+            yield chunk
+        self._body_pending = False
     
-    def do_DELETE(self):
-        """处理DELETE请求 - 转发到后端API"""
-        import time
-        self._request_start_time = time.time()
+    def _iter_chunked_body(self):
+        """解码客户端的 chunked 请求体，按分块产出数据"""
+        view = get_stream_buffer()
+        while True:
+            size_line = self._read_body_line()
+            try:
+                size = int(size_line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise ClientBodyError(f"Invalid chunk size: {size_line[:32]!r}") from None
+            if size == 0:
+                # 跳过 trailer，直到空行
+                while self._read_body_line() not in (b'\r\n', b'\n'):
+                    pass
+                self._body_pending = False
+                return
+            while size > 0:
+                chunk = view[:min(size, len(view))]
+                self._read_exact_into(chunk)
+                size -= len(chunk)
+                yield chunk
+            self._read_body_line()  # 分块结尾的 CRLF
+    
+    def _relay_response(self, response):
+        """
+        把后端响应流式转发给客户端
+        - 使用固定大小的缓冲区 readinto，内存占用不超过一个分块
+        - 写客户端是阻塞写，客户端读得慢时不会继续读取后端，形成天然背压
+        - 后端是 chunked 响应时：HTTP/1.1 连接按 chunked 重新编码转发，HTTP/1.0 连接以关闭连接标记结束
+        - 可压缩的响应按 Accept-Encoding 逐块压缩（见 proxy_compressible），长度未知，分帧规则同 chunked 响应
+        """
+        status = response.status
+        has_body = self.command != 'HEAD' and status >= 200 and status not in (204, 304)
+        response_headers = [(header, value) for header, value in response.getheaders()
+                            if header.lower() not in SKIP_RESPONSE_HEADERS
+                            and not (status == 304 and header.lower() == 'content-length')]
+        compress = finish = None
+        if proxy_compressible(self.command, status, response.headers):
+            encoding = choose_encoding(self.headers.get('Accept-Encoding'), PROXY_ENCODINGS)
+            apply_proxy_compression(response_headers, encoding)
+            if encoding is not None:
+                compress, finish = make_compressor(encoding)
+        content_length = None if compress else response.getheader('Content-Length')
+        use_chunked = (has_body and content_length is None
+                       and self.protocol_version >= 'HTTP/1.1' and self.request_version >= 'HTTP/1.1')
         
-        if self.path.startswith('/api/'):
-            import urllib.request
-            
-            print(f"[请求] DELETE {self.path} - 开始处理")
-            try:
-                backend_url = f'http://localhost:3001{self.path}'
-                
-                # 构建安全的请求头 - 过滤掉不应该转发的头
-                skip_headers = ['host', 'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade']
-                safe_headers = {}
-                for key, value in self.headers.items():
-                    if key.lower() not in skip_headers:
-                        safe_headers[key] = value
-                safe_headers['Host'] = 'localhost:3001'
-                
-                req = urllib.request.Request(backend_url, method='DELETE', headers=safe_headers)
-                
-                # 添加超时设置（10秒）
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    self.send_response(response.getcode())
-                    for header, value in response.headers.items():
-                        if header.lower() not in ['connection', 'transfer-encoding']:
-                            self.send_header(header, value)
-                    self.end_headers()
-                    self.wfile.write(response.read())
-            except (urllib.error.URLError, socket.timeout, TimeoutError) as e:
-                error_msg = str(e)
-                if 'timeout' in error_msg.lower() or isinstance(e, (socket.timeout, TimeoutError)):
-                    self.send_error(504, f"Backend timeout: Request timed out after 10 seconds")
-                else:
-                    self.send_error(502, f"Backend connection error: {error_msg}")
-            except Exception as e:
-                error_msg = str(e)
-                if 'timeout' in error_msg.lower():
-                    self.send_error(504, f"Backend timeout: {error_msg}")
-                else:
-                    self.send_error(502, f"Backend proxy error: {error_msg}")
+        self.send_response(status)
+        for header, value in response_headers:
+            self.send_header(header, value)
+        if use_chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        elif has_body and content_length is None:
+            # 无长度信息，只能以关闭连接来标记响应结束
+            self.close_connection = True
+        self.end_headers()
+        
+        if not has_body:
+            return
+        view = get_stream_buffer()
+        try:
+            while True:
+                n = response.readinto(view)
+                if not n:
+                    break
+                self._write_body_chunk(compress(view[:n]) if compress else view[:n], use_chunked)
+            if response.length:
+                # 后端在 Content-Length 之前断开：http.client 不报错，这里按中断处理，不发送 chunked 结束块
+                raise http.client.IncompleteRead(b'', response.length)
+            if finish is not None:
+                self._write_body_chunk(finish(), use_chunked)
+            if use_chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except (OSError, http.client.HTTPException) as e:
+            # 响应头已发出，无法再返回错误页面，只能中断连接
+            self.close_connection = True
+            logger.error("%s %s - 响应体转发中断: %s", self.command, self.path, e)
+    
+    def _write_body_chunk(self, data, use_chunked):
+        """写出一块响应体；空块跳过（chunked 编码中空块表示结束）"""
+        if not data:
+            return
+        if use_chunked:
+            self.wfile.write(b'%X\r\n' % len(data))
+            self.wfile.write(data)
+            self.wfile.write(b'\r\n')
         else:
-            self.send_error(404, "Not Found")
+            self.wfile.write(data)
     
     def end_headers(self):
-        """添加CORS头和缓存控制"""
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        """添加CORS头、缓存控制和长连接状态"""
+        for header, value in CORS_HEADERS:
+            self.send_header(header, value)
         
         # 静态资源缓存策略
-        if hasattr(self, '_is_static_resource') and self._is_static_resource:
-            # JS/CSS 带哈希的文件可以长期缓存（1年）
-            if '/assets/' in self.path:
-                self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
-            else:
-                # 其他静态资源缓存 1 天
-                self.send_header('Cache-Control', 'public, max-age=86400')
-        elif self.path == '/index.html' or self.path == '/':
-            # HTML 文件不缓存，确保更新时能获取最新版本
-            self.send_header('Cache-Control', 'no-cache, must-revalidate')
+        cache_control = cache_control_for(self.path, getattr(self, '_is_static_resource', False))
+        if cache_control:
+            self.send_header('Cache-Control', cache_control)
         
+        if self._should_close():
+            self.send_header('Connection', 'close')
+        elif self.request_version == 'HTTP/1.0':
+            # HTTP/1.0 客户端明确要求了 keep-alive，需要在响应中确认
+            self.send_header('Connection', 'keep-alive')
+        
+        super().end_headers()
+    
+    def _should_close(self):
+        """
+        本次响应后是否关闭连接：客户端要求关闭、请求体没有读完、达到 KEEPALIVE_MAX_REQUESTS、
+        worker 正在停止，或者线程池里有连接在排队（长连接不应继续占着线程）
+        """
+        if self.close_connection or self._body_pending:
+            return True
+        if self._requests_handled + 1 >= KEEPALIVE_MAX_REQUESTS:
+            return True
+        if self._keepalive is not None and self._keepalive.stopping:
+            return True
+        has_waiting = getattr(self.server, 'has_waiting', None)
+        return has_waiting is not None and has_waiting()
+    
+    def handle_expect_100(self):
+        """100 Continue 是中间响应，只发送状态行，不附带 CORS 和连接相关的响应头"""
+        self.send_response_only(100)
         super().end_headers()
+        return True
     
     def do_OPTIONS(self):
         """处理OPTIONS预检请求"""
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def log_message(self, format, *args):
-        """自定义日志输出"""
-        import time
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-        print(f"[{timestamp}] {format % args}")
+        """自定义日志输出（写入日志队列）"""
+        logger.info("%s - %s", self.address_string(), format % args)
+    
+    def log_error(self, format, *args):
+        """空闲长连接超时是正常现象，只在 DEBUG 级别记录"""
+        if getattr(self, '_awaiting_request', False):
+            logger.debug("%s - %s", self.address_string(), format % args)
+        else:
+            self.log_message(format, *args)
     
     def log_request(self, code='-', size='-'):
-        """记录请求详情，包括处理时间"""
-        import time
-        if not hasattr(self, '_request_start_time'):
-            self._request_start_time = time.time()
-        
-        elapsed = time.time() - self._request_start_time if hasattr(self, '_request_start_time') else 0
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-        
-        print(f"[{timestamp}] {self.address_string()} - \"{self.requestline}\" {code} {size} ({elapsed:.3f}s)")
-        
-        # 如果处理时间超过5秒，记录警告
-        if elapsed > 5:
-            print(f"[警告] 请求处理时间过长: {elapsed:.3f}秒 - {self.path}")
+        """只记下状态码，访问日志在 handle_one_request 结束时统一记录"""
+        if isinstance(code, int):
+            self._response_status = code
+    
+# ==================== 有界线程池引擎（--engine pool） ====================
+
+THREAD_POOL_SIZE = 64          # 常驻处理线程数
+THREAD_POOL_QUEUE_SIZE = 256   # 等待处理的连接队列长度，队列满时直接返回 503
+POOL_KEEPALIVE_TIMEOUT = 5     # 线程数固定，空闲长连接的超时比 KEEPALIVE_TIMEOUT 更短
+# 队列满时本机的 /__status、/__metrics 请求交给单独的线程处理（过载时正需要观察队列深度），
+# 最多等待该秒数读取请求行来判断是否为这两个接口
+POOL_LOCAL_PEEK_TIMEOUT = 1.0
+LOCAL_ENDPOINT_REQUEST_LINES = tuple(f'GET {path} '.encode() for path in (STATUS_PATH, METRICS_PATH))
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """
+    固定大小线程池的 HTTP 服务器
+    ThreadingHTTPServer 每个连接新建一个线程且没有上限，后端卡住时线程会持续堆积；
+    这里由主线程 accept 后放入有界队列，pool_size 个常驻线程依次处理，
+    队列已满时立即回复 503 + Retry-After 并关闭连接；本机的 /__status、/__metrics 请求由预留的 overflow 线程处理
+    长连接会一直占着线程：线程全忙且有新连接排队时，关闭空闲的长连接，进行中的响应也改为 Connection: close
+    """
+
+    keepalive_timeout = POOL_KEEPALIVE_TIMEOUT
+
+    def __init__(self, server_address, handler_class, pool_size=THREAD_POOL_SIZE,
+                 queue_size=THREAD_POOL_QUEUE_SIZE, bind_and_activate=True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self._queue = queue.Queue(queue_size)
+        self._cond = threading.Condition()
+        self._pending = 0  # 已入队但尚未处理完的连接数（含正在处理的）
+        self._busy = 0
+        self._rejected = 0
+        self.keepalive = KeepAliveTracker()
+        self._overflow = queue.Queue(queue_size)
+        self._threads = [threading.Thread(target=self._worker, name=f'pool-{i}', daemon=True)
+                         for i in range(pool_size)]
+        self._threads.append(threading.Thread(target=self._overflow_worker, name='pool-overflow', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def process_request(self, request, client_address):
+        with self._cond:
+            try:
+                self._queue.put_nowait((request, client_address))
+            except queue.Full:
+                queued = saturated = False
+            else:
+                self._pending += 1
+                queued, saturated = True, self._busy >= self.pool_size
+        if not queued:
+            if is_local_client(client_address[0]):
+                # 可能是 /__status、/__metrics：交给 overflow 线程读取请求行后再决定
+                try:
+                    self._overflow.put_nowait((request, client_address))
+                    return
+                except queue.Full:
+                    pass
+            self._reject(request)
+            self.shutdown_request(request)
+        elif saturated:
+            # 线程全部被占用：空闲的长连接让出线程给排队的新连接
+            self.keepalive.close_idle()
+
+    def has_waiting(self):
+        """是否有连接在队列中等待线程"""
+        return not self._queue.empty()
+
+    def _reject(self, request):
+        """队列已满：不读取请求，直接回复 503（在 accept 线程中执行，不能阻塞）"""
+        with self._cond:
+            self._rejected += 1
+        body = render_error_page(503, "Server overloaded, please retry later",
+                                 "The server is temporarily unable to service your request.")
+        head = ['HTTP/1.0 503 Service Unavailable',
+                'Content-Type: text/html;charset=utf-8',
+                f'Content-Length: {len(body)}',
+                f'Retry-After: {OVERLOAD_RETRY_AFTER}']
+        head.extend(f'{name}: {value}' for name, value in CORS_HEADERS)
+        head.append('Connection: close')
+        try:
+            request.setblocking(False)
+            request.send(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+            # 关闭前读掉已到达的请求数据，避免内核回复 RST 导致客户端收不到 503
+            request.recv(STREAM_CHUNK_SIZE)
+        except OSError:
+            pass
+
+    def _worker(self):
+        while True:
+            request, client_address = self._queue.get()
+            with self._cond:
+                self._busy += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._cond:
+                    self._busy -= 1
+                    self._pending -= 1
+                    self._cond.notify_all()
+
+    def _overflow_worker(self):
+        """队列满时本机连接的处理线程：/__status、/__metrics 照常响应，其余请求回复 503"""
+        while True:
+            request, client_address = self._overflow.get()
+            try:
+                if self._is_local_endpoint(request):
+                    self.finish_request(request, client_address)
+                else:
+                    self._reject(request)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    @staticmethod
+    def _is_local_endpoint(request):
+        """查看（不取出）请求行，判断是否为 /__status 或 /__metrics"""
+        try:
+            readable, _, _ = select.select([request], [], [], POOL_LOCAL_PEEK_TIMEOUT)
+            data = request.recv(64, socket.MSG_PEEK) if readable else b''
+        except OSError:
+            return False
+        return data.startswith(LOCAL_ENDPOINT_REQUEST_LINES)
+
+    def pool_stats(self):
+        """队列深度与线程利用率"""
+        with self._cond:
+            return {
+                'size': self.pool_size,
+                'busy': self._busy,
+                'utilization': round(self._busy / self.pool_size, 3),
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self.queue_size,
+                'rejected': self._rejected,
+            }
+
+    def wait_idle(self, timeout):
+        """等待队列中和正在处理的连接全部完成，返回是否在超时前完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+
+# ==================== asyncio 引擎（--engine asyncio） ====================
+
+ASYNC_HEADER_LIMIT = 64 * 1024    # 请求头/响应头最大字节数
+ASYNC_LISTEN_BACKLOG = 2048       # 监听队列长度，应对突发的大量并发连接
+
+
+class AsyncUpstreamPool:
+    """
+    asyncio 版后端长连接池
+    只在事件循环线程中使用，不需要加锁；空闲连接的 EOF 由事件循环实时感知（reader.at_eof()）
+    """
+
+    def __init__(self, host, port, max_size=UPSTREAM_POOL_SIZE, idle_timeout=UPSTREAM_POOL_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = collections.deque()  # (reader, writer, 最后使用时间)
+
+    async def acquire(self):
+        """取出一个连接，返回 (reader, writer, 是否为复用连接)"""
+        now = time.monotonic()
+        while self._idle:
+            reader, writer, last_used = self._idle.pop()
+            if now - last_used <= self.idle_timeout and not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port, limit=ASYNC_HEADER_LIMIT)
+        return reader, writer, False
+
+    def release(self, reader, writer, reusable):
+        """归还连接；响应体未完整读取或后端要求关闭时 reusable 应为 False"""
+        if reusable and not writer.is_closing() and len(self._idle) < self.max_size:
+            self._idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+
+    async def warm(self, count):
+        """与 UpstreamConnectionPool.warm 相同，在事件循环中预先建立连接"""
+        opened = 0
+        for _ in range(min(count, self.max_size)):
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, limit=ASYNC_HEADER_LIMIT), BACKEND_CONNECT_TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                break
+            self.release(reader, writer, True)
+            opened += 1
+        return opened
+
+    def close_all(self):
+        while self._idle:
+            _, writer, _ = self._idle.pop()
+            writer.close()
+
+
+def parse_http_head(head):
+    """解析请求/响应头块，返回 (起始行各字段, HTTPMessage)"""
+    start_line, _, header_block = head.partition(b'\r\n')
+    headers = email.parser.BytesParser(_class=http.client.HTTPMessage).parsebytes(header_block)
+    return start_line.decode('latin-1').rstrip('\r\n').split(' ', 2), headers
+
+
+async def aiter_http_body(reader, headers, timeout=None):
+    """
+    按 HTTP 规则读取消息体，以不超过 STREAM_CHUNK_SIZE 的分块产出
+    headers 为 None 表示读到连接关闭为止
+    """
+    async def read(n):
+        if timeout is None:
+            return await reader.read(n)
+        return await asyncio.wait_for(reader.read(n), timeout)
+
+    async def read_line():
+        if timeout is None:
+            return await reader.readline()
+        return await asyncio.wait_for(reader.readline(), timeout)
+
+    async def read_exact(remaining):
+        while remaining > 0:
+            data = await read(min(remaining, STREAM_CHUNK_SIZE))
+            if not data:
+                raise ConnectionError("Connection closed while reading body")
+            remaining -= len(data)
+            yield data
+
+    if headers is None:
+        while True:
+            data = await read(STREAM_CHUNK_SIZE)
+            if not data:
+                return
+            yield data
+    elif 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        while True:
+            size_line = await read_line()
+            if not size_line:
+                raise ConnectionError("Connection closed while reading chunked body")
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # 跳过 trailer，直到空行
+                while (await read_line()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            async for data in read_exact(size):
+                yield data
+            await read_line()  # 分块结尾的 CRLF
+    else:
+        async for data in read_exact(int(headers.get('Content-Length') or 0)):
+            yield data
+
+
+async def aiter_client_body(reader, headers):
+    """读取客户端请求体（每次读取的超时为 CLIENT_IO_TIMEOUT），失败时统一抛出 ClientBodyError"""
+    try:
+        async for data in aiter_http_body(reader, headers, CLIENT_IO_TIMEOUT):
+            yield data
+    except (asyncio.TimeoutError, OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+        raise ClientBodyError(f"Failed to read request body: {e!r}") from e
+
+
+async def acompress_body(chunks, encoding):
+    """逐块压缩异步分块流，跳过压缩器暂未输出的空块"""
+    compress, finish = make_compressor(encoding)
+    async for data in chunks:
+        data = compress(data)
+        if data:
+            yield data
+    data = finish()
+    if data:
+        yield data
+
+
+async def awrite_http_body(writer, chunks, chunked, timeout=None):
+    """把分块写给对端，每块之后 drain() 等待发送缓冲区排空，形成背压；timeout 为每次 drain 的超时"""
+    async def drain():
+        if timeout is None:
+            await writer.drain()
+        else:
+            await asyncio.wait_for(writer.drain(), timeout)
+
+    async for data in chunks:
+        if chunked:
+            writer.write(b'%X\r\n' % len(data))
+            writer.write(data)
+            writer.write(b'\r\n')
+        else:
+            writer.write(data)
+        await drain()
+    if chunked:
+        writer.write(b'0\r\n\r\n')
+        await drain()
+
+
+class AsyncioHTTPServer:
+    """
+    基于 asyncio 的 HTTP 服务器
+    单线程事件循环 + 非阻塞套接字，与 CustomHTTPRequestHandler 行为一致：
+    SPA 路由回退、静态资源缓存头、CORS、/api/ 代理（502/504 语义）以及 UTF-8 错误页面
+    """
+
+    server_version = 'AsyncHTTP/1.0 Python/' + sys.version.split()[0]
+
+    def __init__(self):
+        self.upstream_pools = {}  # Upstream -> AsyncUpstreamPool
+        self._connections = set()       # 所有客户端连接的 writer
+        self._idle_connections = set()  # 正在等待下一个请求的长连接
+        self._stopping = False
+
+    async def serve(self, host=None, port=None, on_ready=None, sock=None, heartbeat=None, stop_event=None,
+                    warmup=False):
+        """
+        开始监听并处理请求
+        - sock：使用已经绑定好的监听套接字（pre-fork 模式下由主进程创建）
+        - heartbeat：每 WORKER_HEARTBEAT_INTERVAL 秒调用一次，向主进程报告事件循环仍然正常
+        - stop_event：设置后停止接受新连接，等待进行中的请求完成后返回
+        - warmup：开始接受连接前为每个后端预先建立 UPSTREAM_WARMUP_CONNECTIONS 个长连接
+        """
+        if warmup:
+            opened = 0
+            for upstream in UPSTREAMS.upstreams:
+                opened += await self._upstream_pool(upstream).warm(UPSTREAM_WARMUP_CONNECTIONS)
+            logger.info("预热：已建立 %d 个后端连接", opened)
+        profile_task = asyncio.ensure_future(self._profile_loop()) if PROFILER is not None else None
+        if sock is not None:
+            server = await asyncio.start_server(self.handle_connection, sock=sock,
+                                                limit=ASYNC_HEADER_LIMIT, backlog=ASYNC_LISTEN_BACKLOG)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port,
+                                                limit=ASYNC_HEADER_LIMIT, backlog=ASYNC_LISTEN_BACKLOG)
+        if on_ready:
+            on_ready()
+        heartbeat_task = asyncio.ensure_future(self._heartbeat(heartbeat)) if heartbeat else None
+        try:
+            async with server:
+                if stop_event is None:
+                    await server.serve_forever()
+                else:
+                    await stop_event.wait()
+                    server.close()
+                    await self._drain(WORKER_GRACEFUL_TIMEOUT)
+        finally:
+            if heartbeat_task is not None:
+                heartbeat_task.cancel()
+            if profile_task is not None:
+                profile_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await profile_task
+            for pool in self.upstream_pools.values():
+                pool.close_all()
+
+    @staticmethod
+    async def _profile_loop():
+        """--profile：在事件循环线程上持续启用 cProfile，每 PROFILE_DUMP_INTERVAL 秒把统计合并到 PROFILER"""
+        profile = PROFILER.new_profile()
+        profile.enable()
+        try:
+            while True:
+                await asyncio.sleep(PROFILE_DUMP_INTERVAL)
+                profile.disable()
+                PROFILER.collect(profile)
+                profile = PROFILER.new_profile()
+                profile.enable()
+        finally:
+            profile.disable()
+            PROFILER.collect(profile)
+
+    @staticmethod
+    async def _heartbeat(heartbeat):
+        while True:
+            heartbeat()
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+    async def _drain(self, timeout):
+        """停止接受新连接后：关闭空闲长连接，等待进行中的请求完成（最多 timeout 秒）"""
+        self._stopping = True
+        for writer in list(self._idle_connections):
+            writer.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._connections and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+    # ---------- 连接与请求处理 ----------
+
+    async def handle_connection(self, reader, writer):
+        """处理一个客户端连接，支持 HTTP/1.1 keep-alive"""
+        peer = writer.get_extra_info('peername')
+        client_ip = peer[0] if peer else '-'
+        # asyncio 只对 proto 为 IPPROTO_TCP 的套接字自动设置 TCP_NODELAY，
+        # --workers 预先绑定的监听套接字 proto 为 0，需要手动关闭 Nagle，否则小响应会被延迟确认拖慢约 40ms
+        sock = writer.get_extra_info('socket')
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader, writer = _CountingStreamReader(reader), _CountingStreamWriter(writer)
+        self._connections.add(writer)
+        METRICS.connection_opened()
+        served = 0
+        try:
+            while True:
+                self._idle_connections.add(writer)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send_error(writer, None, 431, "Request Header Fields Too Large")
+                    break
+                finally:
+                    self._idle_connections.discard(writer)
+                served += 1
+                keep_alive = await self.handle_request(reader, writer, head, client_ip,
+                                                       last=served >= KEEPALIVE_MAX_REQUESTS)
+                if not keep_alive or self._stopping:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            METRICS.connection_closed()
+            writer.close()
+
+    async def handle_request(self, reader, writer, head, client_ip, last=False):
+        """处理单个请求，返回连接是否可以继续复用；last 表示已达到单连接请求数上限"""
+        start = time.perf_counter()
+        bytes_in, bytes_out = reader.count - len(head), writer.count
+        try:
+            (method, path, version), headers = parse_http_head(head)
+        except ValueError:
+            await self.send_error(writer, None, 400, "Bad request syntax")
+            return False
+
+        req = _AsyncRequest(method, path, version, headers, client_ip, start)
+        connection = headers.get('Connection', '').lower()
+        is_proxy = path.startswith('/api/') and method in PROXY_METHODS
+        has_body = request_has_body(headers)
+        # 未被读取的请求体无法跳过，只能在响应后关闭连接（响应头中提前告知 Connection: close）
+        req.keep_alive = (version == 'HTTP/1.1' and 'close' not in connection and not last
+                          and (is_proxy or not has_body))
+
+        if method == 'OPTIONS':
+            await self.send_response(writer, req, 200, [('Content-Length', '0')])
+        elif is_proxy:
+            await self.proxy(reader, writer, req)
+        elif method == 'GET' and path == STATUS_PATH and is_local_client(client_ip):
+            body = server_status(connections=len(self._connections))
+            await self.send_response(writer, req, 200, [('Content-Type', 'application/json'),
+                                                        ('Content-Length', str(len(body))),
+                                                        ('Cache-Control', 'no-store')], body)
+        elif method == 'GET' and path == METRICS_PATH and is_local_client(client_ip):
+            body = METRICS.render()
+            await self.send_response(writer, req, 200, [('Content-Type', METRICS_CONTENT_TYPE),
+                                                        ('Content-Length', str(len(body))),
+                                                        ('Cache-Control', 'no-store')], body)
+        elif method in ('GET', 'HEAD'):
+            await self.serve_static(writer, req)
+        elif method in PROXY_METHODS:
+            await self.send_error(writer, req, 404, "Not Found")
+        else:
+            await self.send_error(writer, req, 501, f"Unsupported method ({method!r})")
+
+        if req.status is not None:
+            elapsed = time.perf_counter() - start
+            log_access(client_ip, method, path, req.status, elapsed, req.ctx)
+            METRICS.observe_request(method, path, req.status, elapsed,
+                                    reader.count - bytes_in, writer.count - bytes_out)
+        return req.keep_alive and not self._stopping
+
+    # ---------- 响应输出 ----------
+
+    def _head_bytes(self, req, status, headers):
+        """构建状态行和响应头（附带 CORS 和缓存头），并记下状态码供访问日志使用"""
+        reason = SimpleHTTPRequestHandler.responses.get(status, ('',))[0]
+        lines = [f'HTTP/1.1 {status} {reason}',
+                 f'Server: {self.server_version}',
+                 f'Date: {email.utils.formatdate(usegmt=True)}']
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        lines.extend(f'{name}: {value}' for name, value in CORS_HEADERS)
+        if req is not None:
+            req.status = status
+            cache_control = cache_control_for(req.path, req.is_static)
+            if cache_control:
+                lines.append(f'Cache-Control: {cache_control}')
+        if req is None or not req.keep_alive or self._stopping:
+            lines.append('Connection: close')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace')
+
+    async def send_response(self, writer, req, status, headers, body=b''):
+        writer.write(self._head_bytes(req, status, headers))
+        if body and (req is None or req.method != 'HEAD'):
+            writer.write(body)
+        await writer.drain()
+
+    async def send_error(self, writer, req, code, message=None, headers=()):
+        """与 CustomHTTPRequestHandler.send_error 一致的 UTF-8 错误页面"""
+        short_msg, long_msg = SimpleHTTPRequestHandler.responses.get(code, ('???', '???'))
+        self.log_message("code %d, message %s", code, message or short_msg)
+        body = render_error_page(code, message or short_msg, long_msg)
+        await self.send_response(writer, req, code, [('Content-Type', 'text/html;charset=utf-8'),
+                                                      ('Content-Length', str(len(body))), *headers], body)
+
+    def log_message(self, format, *args):
+        logger.info(format, *args)
+
+    # ---------- 静态文件 ----------
+
+    async def serve_static(self, writer, req):
+        req.is_static = is_static_path(req.path)
+        if not req.is_static:
+            # SPA 路由统一返回 index.html，由 React Router 在客户端处理
+            req.path = '/index.html'
+
+        # 在静态文件清单中查找（不访问文件系统），清单中没有的文件直接 404
+        manifest_entry = STATIC_MANIFEST.lookup(manifest_key(req.path))
+        if manifest_entry is None:
+            await self.send_error(writer, req, 404, "File not found")
+            return
+        entry = STATIC_CACHE.get(manifest_entry)
+        if entry is not None:
+            body, encoding = entry.select(req.headers.get('Accept-Encoding'))
+            if entry.is_not_modified(req.headers):
+                await self.send_response(writer, req, 304, entry.not_modified_headers(encoding))
+                return
+            byte_range = resolve_range(req.headers, entry.size, entry.etag, entry.last_modified)
+            if byte_range == RANGE_NOT_SATISFIABLE:
+                await self.send_response(writer, req, 416, [('Content-Range', f'bytes */{entry.size}'),
+                                                            ('Content-Length', '0')])
+            elif byte_range is not None:
+                start, end = byte_range
+                await self.send_response(writer, req, 206, entry.range_headers(start, end),
+                                         memoryview(entry.body)[start:end + 1])
+            else:
+                await self.send_response(writer, req, 200, entry.headers_for(body, encoding), body)
+            return
+
+        # 不适合缓存的文件直接从磁盘发送
+        try:
+            f = open(manifest_entry.fs_path, 'rb')
+        except OSError:
+            await self.send_error(writer, req, 404, "File not found")
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if STATIC_MANIFEST.is_stale(manifest_entry, st):
+                # 新版本正在部署，与 CustomHTTPRequestHandler._send_disk_file 相同返回 503
+                req.is_static = False
+                await self.send_error(writer, req, 503, "Deploy in progress, please retry later",
+                                      headers=[('Retry-After', str(MANIFEST_RETRY_AFTER))])
+                return
+            etag = manifest_entry.etag if manifest_entry.matches(st) else file_etag(st)
+            last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+            if is_not_modified(req.headers, (etag,), st.st_mtime):
+                await self.send_response(writer, req, 304, [('ETag', etag), ('Last-Modified', last_modified)])
+                return
+
+            byte_range = resolve_range(req.headers, st.st_size, etag, last_modified)
+            if byte_range == RANGE_NOT_SATISFIABLE:
+                await self.send_response(writer, req, 416, [('Content-Range', f'bytes */{st.st_size}'),
+                                                            ('Content-Length', '0')])
+                return
+            start, end = byte_range or (0, st.st_size - 1)
+            length = end - start + 1
+            status = 206 if byte_range else 200
+
+            headers = [('Content-Type', manifest_entry.content_type),
+                       ('Content-Length', str(length)),
+                       ('Accept-Ranges', 'bytes'),
+                       ('Last-Modified', last_modified),
+                       ('ETag', etag)]
+            if byte_range:
+                headers.append(('Content-Range', f'bytes {start}-{end}/{st.st_size}'))
+            writer.write(self._head_bytes(req, status, headers))
+            if req.method != 'HEAD' and length > 0:
+                # loop.sendfile 在支持的平台上使用 os.sendfile 零拷贝，否则自动回退为分块读写
+                writer.count += await asyncio.get_running_loop().sendfile(writer.transport, f, start, length,
+                                                                          fallback=True)
+            await writer.drain()
+
+    # ---------- /api/ 代理 ----------
+
+    async def _read_body_for_upstream(self, req, reader, writer):
+        """
+        准备转发给后端的请求体，返回 (body, 长度头, 是否 chunked)
+        不超过一个分块的请求体先读入内存（可重放），更大的以异步生成器流式转发
+        """
+        if (req.version == 'HTTP/1.1' and req.headers.get('Expect', '').lower() == '100-continue'
+                and request_has_body(req.headers)):
+            # 客户端等到 100 Continue 才发送请求体（与 CustomHTTPRequestHandler.handle_expect_100 一致）
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+        chunked = 'chunked' in req.headers.get('Transfer-Encoding', '').lower()
+        if chunked:
+            return aiter_client_body(reader, req.headers), {'Transfer-Encoding': 'chunked'}, True
+        try:
+            content_length = int(req.headers.get('Content-Length') or 0)
+        except ValueError:
+            raise ClientBodyError("Invalid Content-Length") from None
+        if content_length > STREAM_CHUNK_SIZE:
+            return aiter_client_body(reader, req.headers), {'Content-Length': str(content_length)}, False
+        if content_length > 0:
+            try:
+                body = await asyncio.wait_for(reader.readexactly(content_length), CLIENT_IO_TIMEOUT)
+            except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError) as e:
+                raise ClientBodyError(f"Failed to read request body: {e!r}") from e
+            return body, {'Content-Length': str(content_length)}, False
+        if PROXY_METHODS[req.method].json_body:
+            return b'', {'Content-Length': '0'}, False
+        return b'', {}, False
+
+    def _upstream_pool(self, upstream):
+        pool = self.upstream_pools.get(upstream)
+        if pool is None:
+            pool = self.upstream_pools[upstream] = AsyncUpstreamPool(upstream.host, upstream.port)
+        return pool
+
+    def _release_upstream(self, upstream, up_reader, up_writer, reusable):
+        self._upstream_pool(upstream).release(up_reader, up_writer, reusable)
+        UPSTREAMS.finish(upstream)
+
+    async def _open_upstream(self, req, upstream_headers, body, chunked, timing=None):
+        """
+        选择后端并发送请求，返回 (upstream, up_reader, up_writer, 状态码, 响应头)
+        失败重试和熔断规则与 UpstreamGroup.request 相同；读完响应后必须调用 _release_upstream
+        """
+        tried = []
+        upstream = UPSTREAMS.choose()
+        while True:
+            try:
+                result = await self._send_upstream(upstream, req, upstream_headers, body, chunked, timing)
+            except (asyncio.TimeoutError, OSError, ValueError, asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError) as e:
+                UPSTREAMS.finish(upstream)
+                UPSTREAMS.record(upstream, e)
+                tried.append(upstream)
+                next_upstream = UPSTREAMS.retry_target(req.method, tried)
+                if next_upstream is None:
+                    raise
+                logger.warning("%s %s - 后端 %s 失败: %r，换 %s 重试", req.method, req.path, upstream.name, e,
+                               next_upstream.name)
+                upstream = next_upstream
+                continue
+            except BaseException:
+                UPSTREAMS.finish(upstream)
+                raise
+            UPSTREAMS.record(upstream)
+            return (upstream,) + result
+
+    async def _send_upstream(self, upstream, req, upstream_headers, body, chunked, timing):
+        """
+        通过指定后端的连接池发送请求并读取响应头，返回 (up_reader, up_writer, 状态码, 响应头)
+        复用的连接已失效且请求体可重放时，换一个连接重试
+        （仅限 GET/HEAD 或请求尚未完整写出，避免重放可能已被后端执行的写请求）
+        timing（ProxyContext）不为空时记录 connect 和 ttfb 耗时
+        连接超时为 BACKEND_CONNECT_TIMEOUT；每次写入后端和等待响应头的超时为该路由的响应超时
+        （读取客户端请求体的超时另计，客户端慢不会被当作后端超时）
+        """
+        lines = [f'{req.method} {req.path} HTTP/1.1', f'Host: {upstream.name}']
+        lines.extend(f'{name}: {value}' for name, value in upstream_headers.items())
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace')
+
+        pool = self._upstream_pool(upstream)
+        started = time.perf_counter()
+        while True:
+            try:
+                up_reader, up_writer, reused = await asyncio.wait_for(pool.acquire(), BACKEND_CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise UpstreamConnectTimeout(
+                    f"connect to {upstream.name} timed out after {BACKEND_CONNECT_TIMEOUT} seconds") from None
+            connected = time.perf_counter()
+            sent = False
+            try:
+                await self._write_request(up_writer, head, body, chunked, req.ctx.read_timeout)
+                sent = True
+                response_head = await self._read_response_head(up_reader, req.ctx.read_timeout)
+                (_, status, *_), headers = parse_http_head(response_head)
+                if timing is not None:
+                    timing.connect = connected - started
+                    timing.ttfb = time.perf_counter() - connected
+                return up_reader, up_writer, int(status), headers
+            except (ConnectionError, asyncio.IncompleteReadError):
+                up_writer.close()
+                # 复用连接已被后端关闭（keep-alive 竞态）且请求体可重放时，换连接重试；
+                # 请求已完整写出后才失败的非幂等请求可能已被后端执行，不重放
+                if not reused or not isinstance(body, bytes) or (sent and req.method not in IDEMPOTENT_METHODS):
+                    raise
+            except BaseException:
+                up_writer.close()
+                raise
+
+    @staticmethod
+    async def _write_request(up_writer, head, body, chunked, timeout):
+        """向后端写出请求头和请求体"""
+        up_writer.write(head)
+        if isinstance(body, bytes):
+            up_writer.write(body)
+            await asyncio.wait_for(up_writer.drain(), timeout)
+        else:
+            await awrite_http_body(up_writer, body, chunked, timeout)
+
+    @staticmethod
+    async def _read_response_head(up_reader, timeout):
+        """读取最终响应的响应头块（跳过 100 Continue、103 Early Hints 等 1xx 中间响应）"""
+        while True:
+            response_head = await asyncio.wait_for(up_reader.readuntil(b'\r\n\r\n'), timeout)
+            status = response_head.split(b' ', 2)[1:2]
+            if not status or not status[0].startswith(b'1'):
+                return response_head
+
+    async def proxy(self, reader, writer, req):
+        """所有 /api/ 请求的统一代理流程，与 CustomHTTPRequestHandler._proxy 相同"""
+        ctx = req.ctx = ProxyContext(req.method, req.path, req.headers)
+        ctx.start = req.start
+        logger.debug("%s %s - 开始处理", req.method, req.path)
+        body = b''
+        try:
+            body, body_headers, chunked = await self._read_body_for_upstream(req, reader, writer)
+            ctx.upstream_headers = build_upstream_headers(req.method, req.headers, body_headers)
+            run_proxy_hooks('pre_request', ctx)
+
+            # 开启 --api-cache 时，轮询频繁的只读接口走短期缓存
+            cache_key = API_CACHE.cache_key(req.path, req.headers) if req.method == 'GET' else None
+            if cache_key is not None and await self._proxy_cached_get(writer, req, ctx, cache_key):
+                return
+            with UPSTREAM_ADMISSION.slot():
+                upstream, up_reader, up_writer, status, headers = await self._open_upstream(
+                    req, ctx.upstream_headers, body, chunked, ctx)
+                ctx.status = status
+                transfer_start = time.perf_counter()
+                await self._relay_upstream(writer, req, upstream, up_reader, up_writer, status, headers)
+                ctx.transfer = time.perf_counter() - transfer_start
+        except UpstreamOverloaded as e:
+            ctx.error = e
+            ctx.status = 503
+            logger.warning("%s %s - 后端请求已达上限 %d，返回 503", req.method, req.path, UPSTREAM_ADMISSION.limit)
+            # 流式请求体还没有转发（也就没有读完），连接不能继续复用
+            req.keep_alive = req.keep_alive and isinstance(body, bytes)
+            await self.send_error(writer, req, 503, "Upstream overloaded, please retry later",
+                                  headers=[('Retry-After', str(OVERLOAD_RETRY_AFTER))])
+        except UpstreamUnavailable as e:
+            ctx.error = e
+            ctx.status = 503
+            logger.warning("%s %s - 后端熔断中，返回 503", req.method, req.path)
+            # 流式请求体还没有转发（也就没有读完），连接不能继续复用
+            req.keep_alive = req.keep_alive and isinstance(body, bytes)
+            await self.send_error(writer, req, 503, "Backend unavailable, please retry later",
+                                  headers=[('Retry-After', str(e.retry_after))])
+        except ClientBodyError as e:
+            # 客户端的问题（不计入后端健康检查和熔断）：请求体没有读完，返回 400 后关闭连接
+            ctx.error = e
+            ctx.status = 400
+            logger.warning("%s %s - 读取请求体失败: %s", req.method, req.path, e)
+            req.keep_alive = False
+            await self.send_error(writer, req, 400, "Bad request body")
+        except (asyncio.TimeoutError, OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            ctx.error = e
+            code, log_msg, error_msg = classify_proxy_error(e, ctx.read_timeout)
+            ctx.status = code
+            logger.error("%s %s - %s (%.3fs)", req.method, req.path, log_msg, time.perf_counter() - req.start)
+            req.keep_alive = False
+            await self.send_error(writer, req, code, error_msg)
+        except Exception as e:
+            # 其他意外错误与 CustomHTTPRequestHandler._proxy 一样返回 502，而不是直接断开客户端连接
+            ctx.error = e
+            logger.error("%s %s - 代理错误: %s (%.3fs)", req.method, req.path, e, time.perf_counter() - req.start)
+            req.keep_alive = False
+            if req.status is None:
+                # 响应头已经发出时只能关闭连接
+                ctx.status = 502
+                await self.send_error(writer, req, 502, f"Backend proxy error: {e}")
+        finally:
+            ctx.elapsed = time.perf_counter() - ctx.start
+            run_proxy_hooks('post_response', ctx)
+
+    async def _proxy_cached_get(self, writer, req, ctx, cache_key):
+        """带短期缓存和请求合并的 GET 代理，规则与 CustomHTTPRequestHandler._proxy_cached_get 相同"""
+        entry = API_CACHE.get(cache_key)
+        cache_status = 'HIT'
+        if entry is None:
+            flight, leader = API_CACHE.begin(cache_key)
+            if not leader:
+                entry = await flight.wait_async(ctx.read_timeout)
+                if entry is None:
+                    return False
+            else:
+                # leader：去掉条件请求头，拿到完整的 200 响应才能缓存
+                upstream_headers = {k: v for k, v in ctx.upstream_headers.items()
+                                    if k.lower() not in ('if-none-match', 'if-modified-since')}
+                status = headers = body = None
+                try:
+                    with UPSTREAM_ADMISSION.slot():
+                        upstream, up_reader, up_writer, status, headers = await self._open_upstream(
+                            req, upstream_headers, b'', False, ctx)
+                        transfer_start = time.perf_counter()
+                        length = headers.get('Content-Length')
+                        if status != 200 or length is None or int(length) > API_CACHE.max_entry_size:
+                            API_CACHE.finish(cache_key, flight)
+                            flight = None
+                            ctx.status = status
+                            await self._relay_upstream(writer, req, upstream, up_reader, up_writer, status, headers)
+                            ctx.transfer = time.perf_counter() - transfer_start
+                            return True
+                        try:
+                            body = await asyncio.wait_for(up_reader.readexactly(int(length)), ctx.read_timeout)
+                        except BaseException:
+                            self._release_upstream(upstream, up_reader, up_writer, False)
+                            raise
+                        ctx.transfer = time.perf_counter() - transfer_start
+                        self._release_upstream(upstream, up_reader, up_writer,
+                                               'close' not in headers.get('Connection', '').lower())
+                        headers = list(headers.items())
+                finally:
+                    if flight is not None:
+                        entry = API_CACHE.finish(cache_key, flight, status, headers, body)
+                if entry is None:
+                    entry = CachedApiResponse(headers, body, None, 0)
+                cache_status = 'MISS'
+
+        if_none_match = req.headers.get('If-None-Match')
+        if entry.etag and if_none_match and etag_matches(if_none_match, (entry.etag,)):
+            ctx.status = 304
+            await self.send_response(writer, req, 304, [('ETag', entry.etag), ('X-Cache', cache_status)])
+        else:
+            body, headers = entry.select(req.headers.get('Accept-Encoding'))
+            headers = headers + [('Content-Length', str(len(body))), ('X-Cache', cache_status)]
+            ctx.status = 200
+            await self.send_response(writer, req, 200, headers, body)
+        return True
+
+    async def _relay_upstream(self, writer, req, upstream, up_reader, up_writer, status, headers):
+        """把后端响应流式转发给客户端"""
+        has_body = req.method != 'HEAD' and status >= 200 and status not in (204, 304)
+        upstream_chunked = 'chunked' in headers.get('Transfer-Encoding', '').lower()
+        has_length = 'Content-Length' in headers
+        # 无长度信息的非 chunked 响应只能读到后端关闭连接为止
+        read_until_close = has_body and not upstream_chunked and not has_length
+        reusable = not read_until_close and 'close' not in headers.get('Connection', '').lower()
+
+        response_headers = []
+        for name, value in headers.items():
+            lower = name.lower()
+            if lower in SKIP_RESPONSE_HEADERS or (lower == 'content-length' and status == 304):
+                continue
+            response_headers.append((name, value))
+        encoding = None
+        if proxy_compressible(req.method, status, headers):
+            encoding = choose_encoding(req.headers.get('Accept-Encoding'), PROXY_ENCODINGS)
+            apply_proxy_compression(response_headers, encoding)
+            if encoding is not None:
+                has_length = False
+        use_chunked = has_body and not has_length and req.keep_alive
+        if use_chunked:
+            response_headers.append(('Transfer-Encoding', 'chunked'))
+        elif has_body and not has_length:
+            req.keep_alive = False
+
+        try:
+            writer.write(self._head_bytes(req, status, response_headers))
+            if has_body:
+                chunks = aiter_http_body(up_reader, None if read_until_close else headers, req.ctx.read_timeout)
+                if encoding is not None:
+                    chunks = acompress_body(chunks, encoding)
+                await awrite_http_body(writer, chunks, use_chunked)
+            else:
+                await writer.drain()
+        except BaseException as e:
+            # 响应头已发出，无法再返回错误页面，只能中断连接
+            self._release_upstream(upstream, up_reader, up_writer, False)
+            req.keep_alive = False
+            if not isinstance(e, Exception):
+                raise
+            logger.error("%s %s - 响应体转发中断: %s", req.method, req.path, e)
+            return
+        self._release_upstream(upstream, up_reader, up_writer, reusable)
+
+
+class _CountingStreamReader:
+    """包装客户端连接的 StreamReader，统计读到的字节数"""
+
+    __slots__ = ('raw', 'count')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    async def read(self, n=-1):
+        data = await self.raw.read(n)
+        self.count += len(data)
+        return data
+
+    async def readline(self):
+        data = await self.raw.readline()
+        self.count += len(data)
+        return data
+
+    async def readuntil(self, separator=b'\n'):
+        data = await self.raw.readuntil(separator)
+        self.count += len(data)
+        return data
+
+    async def readexactly(self, n):
+        data = await self.raw.readexactly(n)
+        self.count += n
+        return data
+
+    def at_eof(self):
+        return self.raw.at_eof()
+
+
+class _CountingStreamWriter:
+    """包装客户端连接的 StreamWriter，统计写出的字节数"""
+
+    __slots__ = ('raw', 'count')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    @property
+    def transport(self):
+        return self.raw.transport
+
+    def write(self, data):
+        self.raw.write(data)
+        self.count += len(data)
+
+    async def drain(self):
+        await self.raw.drain()
+
+    def close(self):
+        self.raw.close()
+
+    def is_closing(self):
+        return self.raw.is_closing()
+
+    def get_extra_info(self, name, default=None):
+        return self.raw.get_extra_info(name, default)
+
+
+class _AsyncRequest:
+    """asyncio 引擎中的单个请求状态"""
+
+    __slots__ = ('method', 'path', 'version', 'headers', 'client_ip', 'start', 'keep_alive', 'is_static',
+                 'status', 'ctx')
+
+    def __init__(self, method, path, version, headers, client_ip, start):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.client_ip = client_ip
+        self.start = start
+        self.keep_alive = False
+        self.is_static = False
+        self.status = None  # 已发出的响应状态码
+        self.ctx = None     # 代理请求的 ProxyContext
+
+
+def raise_open_file_limit():
+    """尽量把进程可打开的文件数提高到硬上限，支撑大量并发长连接（仅类 Unix 系统）"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else max(soft, 65536), hard))
+        except (ValueError, OSError):
+            pass
+
+
+def load_asyncio():
+    """
+    导入 asyncio 并绑定到模块全局名称 asyncio（导入约 50ms，线程引擎用不到，只在选择 asyncio 引擎时导入）
+    AsyncioHTTPServer 等只在 asyncio 引擎中运行的代码都通过这个全局名称使用它
+    """
+    global asyncio
+    import asyncio
+
+
+def run_asyncio_server(host, port, on_ready=None, warmup=False):
+    """以 asyncio 引擎运行服务器（阻塞直到 Ctrl+C）"""
+    load_asyncio()
+    raise_open_file_limit()
+    server = AsyncioHTTPServer()
+    asyncio.run(server.serve(host, port, on_ready, warmup=warmup))
+
+
+# ==================== 多进程 pre-fork 模式（--workers N） ====================
+
+WORKER_HEARTBEAT_INTERVAL = 1.0   # worker 上报心跳的间隔（秒）
+WORKER_HEARTBEAT_TIMEOUT = 15     # 超过该秒数没有心跳的 worker 视为卡死，强制结束
+WORKER_GRACEFUL_TIMEOUT = 10      # 停止/重启时等待进行中请求完成的最长时间（秒）
+WORKER_RESPAWN_BACKOFF_MAX = 30   # worker 连续启动失败时重新拉起的最大间隔（秒）
+WORKER_MIN_UPTIME = 5             # 运行不足该秒数就退出的 worker 计为一次启动失败
+
+
+class WorkerHeartbeats:
+    """
+    主进程与 worker 进程共享的心跳表
+    使用 fork 前创建的匿名共享内存，每个槽位存放一个 time.monotonic() 时间戳和一个就绪标记
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        # 前 8 * slots 字节为时间戳，之后每个槽位 1 字节的就绪标记
+        self._buf = mmap.mmap(-1, 9 * slots)
+
+    def reset(self, slot):
+        """槽位分配给新 worker 之前调用：启动期间的宽限时间从现在算起，并清除就绪标记"""
+        self.beat(slot)
+        self._buf[8 * self.slots + slot] = 0
+
+    def beat(self, slot):
+        struct.pack_into('d', self._buf, slot * 8, time.monotonic())
+
+    def last(self, slot):
+        return struct.unpack_from('d', self._buf, slot * 8)[0]
+
+    def mark_ready(self, slot):
+        """worker 完成预热、开始接受连接时调用"""
+        self._buf[8 * self.slots + slot] = 1
+
+    def is_ready(self, slot):
+        return self._buf[8 * self.slots + slot] == 1
+
+
+class PreforkWorkerMixin:
+    """
+    pre-fork 模式下 worker 进程使用的服务器
+    - 直接使用主进程预先绑定好的监听套接字，不再自己绑定端口
+    - 在 serve_forever 循环中上报心跳，主进程据此判断 worker 是否卡死
+    """
+
+    def __init__(self, sock, handler_class, *args, heartbeat=None):
+        self.heartbeat = heartbeat
+        self._last_beat = 0.0
+        super().__init__(sock.getsockname()[:2], handler_class, *args, bind_and_activate=False)
+        self.socket.close()
+        # 多个进程同时等待同一个套接字，抢不到连接时 accept 不能阻塞
+        sock.setblocking(False)
+        self.socket = sock
+        self.server_address = sock.getsockname()
+        self.server_name = socket.getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+
+    def service_actions(self):
+        super().service_actions()
+        now = time.monotonic()
+        if self.heartbeat and now - self._last_beat >= WORKER_HEARTBEAT_INTERVAL:
+            self._last_beat = now
+            self.heartbeat()
+
+
+class WorkerThreadingHTTPServer(PreforkWorkerMixin, ThreadingHTTPServer):
+    """worker 进程中的 threading 引擎，记录正在处理的请求数，便于优雅退出"""
+
+    def __init__(self, sock, handler_class, heartbeat=None):
+        self._active = 0
+        self._active_cond = threading.Condition()
+        self.keepalive = KeepAliveTracker()
+        super().__init__(sock, handler_class, heartbeat=heartbeat)
+
+    def process_request_thread(self, request, client_address):
+        with self._active_cond:
+            self._active += 1
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._active_cond:
+                self._active -= 1
+                self._active_cond.notify_all()
+
+    def wait_idle(self, timeout):
+        """等待进行中的请求处理完成，返回是否在超时前全部完成"""
+        with self._active_cond:
+            return self._active_cond.wait_for(lambda: self._active == 0, timeout)
+
+
+class WorkerThreadPoolHTTPServer(PreforkWorkerMixin, ThreadPoolHTTPServer):
+    """worker 进程中的 pool 引擎"""
+
+
+def run_worker(args, slot, heartbeats, listen_sock):
+    """worker 进程入口：SIGTERM 时停止接受新连接，处理完进行中的请求后退出"""
+    # Ctrl+C 会发给整个进程组，由主进程统一协调退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    # 主进程同步写日志；worker 在 fork 之后再启动自己的日志线程
+    setup_logging(args.log_level, args.log_format)
+    # 后台线程不会随 fork 复制，每个 worker 自己检查静态文件目录的变化、写出性能分析结果
+    STATIC_MANIFEST.start_watching()
+    if PROFILER is not None:
+        PROFILER.start()
+    beat = functools.partial(heartbeats.beat, slot)
+
+    if args.engine == 'asyncio':
+        raise_open_file_limit()
+        server = AsyncioHTTPServer()
+
+        async def serve():
+            stop_event = asyncio.Event()
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop_event.set)
+            await server.serve(sock=listen_sock, on_ready=functools.partial(heartbeats.mark_ready, slot),
+                               heartbeat=beat, stop_event=stop_event, warmup=args.warmup)
+
+        asyncio.run(serve())
+        if PROFILER is not None:
+            PROFILER.dump()
+        return
+
+    if args.engine == 'pool':
+        server = WorkerThreadPoolHTTPServer(listen_sock, CustomHTTPRequestHandler,
+                                            args.pool_size, args.pool_queue, heartbeat=beat)
+    else:
+        server = WorkerThreadingHTTPServer(listen_sock, CustomHTTPRequestHandler, heartbeat=beat)
+    # shutdown() 会等待 serve_forever 退出，不能在运行 serve_forever 的主线程里直接调用
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start())
+    if args.warmup:
+        logger.info("预热：已建立 %d 个后端连接", UPSTREAMS.warm(UPSTREAM_WARMUP_CONNECTIONS))
+    # 平滑重启时主进程等到这里才让旧 worker 退出
+    heartbeats.mark_ready(slot)
+    try:
+        server.serve_forever()
+    finally:
+        # 空闲长连接立即关闭，进行中的请求响应后关闭，不再等待客户端的下一个请求
+        server.keepalive.close_idle(stop=True)
+        if not server.wait_idle(WORKER_GRACEFUL_TIMEOUT):
+            logger.warning("worker %d 仍有未完成的请求，强制退出", os.getpid())
+        server.server_close()
+        UPSTREAMS.close_all()
+        if PROFILER is not None:
+            PROFILER.dump()
+
+
+class PreforkMaster:
+    """
+    pre-fork 主进程：只负责管理 worker，不处理请求
+    - 主进程预先绑定监听套接字，N 个 worker 共享它接受连接
+      （不用 SO_REUSEPORT：worker 退出时，内核已分配到其队列中的连接会被重置，无法做到平滑重启）
+    - worker 异常退出时自动重新拉起，连续启动失败时逐步拉长间隔
+    - 心跳超时的 worker 视为卡死，强制结束后重新拉起
+    - SIGHUP：逐个平滑重启 worker（新 worker 就绪后再让旧 worker 处理完请求退出）
+    - Ctrl+C / SIGTERM：通知所有 worker 优雅退出，超时后强制结束
+    """
+
+    def __init__(self, args, on_ready=None):
+        self.args = args
+        self.count = args.workers
+        self.on_ready = on_ready
+        self.heartbeats = WorkerHeartbeats(self.count * 2)  # 平滑重启时新旧 worker 短暂共存
+        self.workers = {}      # pid -> (槽位, 启动时间)
+        self.retiring = set()  # 已通知退出、等待回收的 worker
+        self.listen_sock = None
+        self.stopping = False
+        self.reload_requested = False
+        self.failures = 0
+        self.next_spawn_at = 0.0
+
+    def _free_slot(self):
+        used = {slot for slot, _ in self.workers.values()}
+        return next(slot for slot in range(self.heartbeats.slots) if slot not in used)
+
+    def spawn(self):
+        slot = self._free_slot()
+        started = time.monotonic()
+        self.heartbeats.reset(slot)
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(self.args, slot, self.heartbeats, self.listen_sock)
+            except BaseException as e:
+                logger.error("worker %d 异常退出: %s", os.getpid(), e)
+                exit_code = 1
+            finally:
+                stop_logging()
+                os._exit(exit_code)
+        self.workers[pid] = (slot, started)
+        logger.info("worker %d 已启动", pid)
+        return pid
+
+    def _signal_stop(self, signum, frame):
+        self.stopping = True
+
+    def _signal_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def _kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        """回收已退出的 worker，返回是否有 worker 退出"""
+        reaped = False
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            reaped = True
+            _, started = self.workers.pop(pid, (None, time.monotonic()))
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            if self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            logger.warning("worker %d 意外退出（退出码 %d），准备重新启动", pid, code)
+            if time.monotonic() - started < WORKER_MIN_UPTIME:
+                self.failures += 1
+                delay = min(2 ** (self.failures - 1), WORKER_RESPAWN_BACKOFF_MAX)
+                self.next_spawn_at = time.monotonic() + delay
+                logger.warning("worker 启动后很快退出，%d 秒后重试", delay)
+            else:
+                self.failures = 0
+        return reaped
+
+    def check_heartbeats(self):
+        now = time.monotonic()
+        for pid, (slot, _) in list(self.workers.items()):
+            if now - self.heartbeats.last(slot) > WORKER_HEARTBEAT_TIMEOUT:
+                logger.warning("worker %d 超过 %s 秒没有心跳，强制结束", pid, WORKER_HEARTBEAT_TIMEOUT)
+                self._kill(pid, signal.SIGKILL)
+
+    def maintain(self):
+        missing = self.count - (len(self.workers) - len(self.retiring))
+        if missing > 0 and time.monotonic() >= self.next_spawn_at:
+            for _ in range(missing):
+                self.spawn()
+
+    def _wait_ready(self, pid, timeout):
+        """等待新 worker 完成预热并开始接受连接（心跳在 fork 之前就已写入，不能作为就绪依据）"""
+        slot, _ = self.workers[pid]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self.stopping:
+            self.reap()
+            if pid not in self.workers:
+                return False
+            if self.heartbeats.is_ready(slot):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def reload(self):
+        """逐个替换 worker，任一时刻都有 worker 在接受连接"""
+        logger.info("收到 SIGHUP，开始平滑重启 worker")
+        for old_pid in [pid for pid in self.workers if pid not in self.retiring]:
+            if self.stopping:
+                return
+            if old_pid not in self.workers:
+                continue
+            new_pid = self.spawn()
+            if not self._wait_ready(new_pid, WORKER_HEARTBEAT_TIMEOUT):
+                logger.error("新 worker %d 未能就绪，停止平滑重启", new_pid)
+                return
+            if old_pid in self.workers:
+                self.retiring.add(old_pid)
+                self._kill(old_pid, signal.SIGTERM)
+        logger.info("worker 平滑重启完成")
+
+    def shutdown(self):
+        for pid in self.workers:
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + WORKER_GRACEFUL_TIMEOUT + 1
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in self.workers:
+            logger.warning("worker %d 未能按时退出，强制结束", pid)
+            self._kill(pid, signal.SIGKILL)
+        while self.workers:
+            if not self.reap():
+                time.sleep(0.05)
+        self.listen_sock.close()
+
+    def run(self):
+        self.listen_sock = socket.create_server((self.args.host, self.args.port), backlog=ASYNC_LISTEN_BACKLOG)
+        signal.signal(signal.SIGINT, self._signal_stop)
+        signal.signal(signal.SIGTERM, self._signal_stop)
+        signal.signal(signal.SIGHUP, self._signal_reload)
+        for _ in range(self.count):
+            self.spawn()
+        if self.on_ready:
+            self.on_ready()
+        try:
+            while not self.stopping:
+                self.reap()
+                self.check_heartbeats()
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.reload()
+                self.maintain()
+                time.sleep(0.2)
+        finally:
+            self.shutdown()
+
 
 def check_port_available(port):
     """检查端口是否可用"""
@@ -419,8 +4025,87 @@ def check_port_available(port):
     except OSError:
         return False
 
+def parse_args(argv=None):
+    """解析命令行参数（默认值与文件顶部的配置一致）"""
+    parser = argparse.ArgumentParser(description='星辰早晨 Python HTTP 服务器（静态文件 + /api/ 代理）')
+    parser.add_argument('--host', default=HOST, help=f'监听地址（默认 {HOST}）')
+    parser.add_argument('--port', type=int, default=PORT, help=f'监听端口（默认 {PORT}）')
+    parser.add_argument('--backend', metavar='HOST:PORT[,HOST:PORT...]', default=f'{BACKEND_HOST}:{BACKEND_PORT}',
+                        help=f'后端 API 服务器地址，多个实例用逗号分隔（默认 {BACKEND_HOST}:{BACKEND_PORT}）')
+    parser.add_argument('--balance', choices=('round-robin', 'least-outstanding'), default=UPSTREAM_BALANCE,
+                        help=f'多个后端时的选择策略：轮询或在途请求最少（默认 {UPSTREAM_BALANCE}）')
+    parser.add_argument('--connect-timeout', type=float, default=BACKEND_CONNECT_TIMEOUT,
+                        help=f'连接后端超时秒数（默认 {BACKEND_CONNECT_TIMEOUT}）')
+    parser.add_argument('--read-timeout', type=float, default=BACKEND_TIMEOUT,
+                        help=f'等待后端响应的超时秒数（默认 {BACKEND_TIMEOUT}，个别路由见 ROUTE_TIMEOUTS）')
+    parser.add_argument('--dist-dir', help='静态文件目录（默认为项目根目录下的 frontend/dist）')
+    parser.add_argument('--no-watch', dest='watch', action='store_false',
+                        help=f'不检查静态文件目录的变化（默认每 {MANIFEST_POLL_INTERVAL:g} 秒检查一次，重新构建完成后自动切换）')
+    parser.add_argument('--engine', choices=('threading', 'pool', 'asyncio'), default='threading',
+                        help='服务器引擎：threading 为每个连接一个线程（默认），pool 为固定大小线程池，'
+                             'asyncio 为单线程事件循环')
+    parser.add_argument('--pool-size', type=int, default=THREAD_POOL_SIZE,
+                        help=f'pool 引擎的处理线程数（默认 {THREAD_POOL_SIZE}）')
+    parser.add_argument('--pool-queue', type=int, default=THREAD_POOL_QUEUE_SIZE,
+                        help=f'pool 引擎等待处理的连接队列长度，满时返回 503（默认 {THREAD_POOL_QUEUE_SIZE}）')
+    parser.add_argument('--max-upstream', type=int, default=MAX_UPSTREAM_INFLIGHT,
+                        help='同时在途的后端请求数上限，超出时返回 503（默认 0，不限制）')
+    parser.add_argument('--api-cache', action='store_true',
+                        help='为轮询频繁的只读 /api/ 接口开启短期缓存和请求合并（见 API_CACHE_TTLS）')
+    parser.add_argument('--no-api-compression', dest='api_compression', action='store_false',
+                        help='不压缩 /api/ 响应（默认按 Accept-Encoding 压缩 JSON 等文本响应）')
+    parser.add_argument('--log-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), default=LOG_LEVEL,
+                        help=f'日志级别（默认 {LOG_LEVEL}；DEBUG 会输出代理开始、请求体长度等调试信息）')
+    parser.add_argument('--log-format', choices=('json', 'text'), default=LOG_FORMAT,
+                        help=f'日志格式：json 为每行一个 JSON 对象，text 便于在控制台阅读（默认 {LOG_FORMAT}）')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker 进程数（默认 1，即单进程）；大于 1 时启用 pre-fork 多进程模式（仅 Linux/macOS）')
+    parser.add_argument('--warmup', action='store_true',
+                        help=f'开始接受连接前预先载入静态文件缓存，并为每个后端建立 {UPSTREAM_WARMUP_CONNECTIONS} 个连接')
+    parser.add_argument('--profile', metavar='DIR',
+                        help=f'对请求处理路径做 cProfile/tracemalloc 分析，每 {PROFILE_DUMP_INTERVAL} 秒及退出时写入 DIR')
+    return parser.parse_args(argv)
+
+
+def print_started_banner(port, started):
+    """服务器开始监听后输出的提示信息（started 为 main() 开始时的 time.perf_counter()）"""
+    local_url = 'http://localhost/' if port == 80 else f'http://localhost:{port}/'
+    print(f"[成功] 服务器已启动（启动耗时 {(time.perf_counter() - started) * 1000:.0f} ms）")
+    print(f"[信息] 访问地址: {local_url}")
+    print(f"[信息] 或访问: http://{DOMAIN}/")
+    print()
+    print("[提示] 如需使用域名访问，请在hosts文件中添加:")
+    print(f"       127.0.0.1    {DOMAIN}")
+    print()
+    print("按 Ctrl+C 停止服务器")
+    print("=" * 50)
+    print()
+
+
 def main():
     """主函数"""
+    global STATIC_ROOT, BACKEND_CONNECT_TIMEOUT, BACKEND_TIMEOUT, PROXY_COMPRESS, PROFILER
+    started = time.perf_counter()
+    args = parse_args()
+    BACKEND_CONNECT_TIMEOUT, BACKEND_TIMEOUT = args.connect_timeout, args.read_timeout
+    PROXY_COMPRESS = args.api_compression
+    UPSTREAMS.balance = args.balance
+    UPSTREAMS.configure(parse_backends(args.backend))
+    if args.dist_dir:
+        # 下面会切换到项目根目录，相对路径需要先转换
+        STATIC_ROOT = os.path.abspath(args.dist_dir)
+    if args.profile:
+        PROFILER = RequestProfiler(os.path.abspath(args.profile))
+    if args.engine == 'asyncio':
+        # 在 fork 和开始 tracemalloc 之前导入，pre-fork 模式下所有 worker 共享
+        load_asyncio()
+    API_CACHE.enabled = args.api_cache
+    UPSTREAM_ADMISSION.limit = args.max_upstream
+    if args.workers > 1 and not hasattr(os, 'fork'):
+        print("[警告] 当前系统不支持 fork，--workers 无效，以单进程模式运行")
+        args.workers = 1
+    setup_logging(args.log_level, args.log_format, use_queue=args.workers <= 1)
+    
     # Change to project root directory (parent of scripts folder)
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
@@ -430,20 +4115,33 @@ def main():
     print("Python HTTP 服务器")
     print("=" * 50)
     print(f"域名: http://{DOMAIN}/")
-    print(f"监听地址: {HOST}:{PORT}")
+    print(f"监听地址: {args.host}:{args.port}")
+    print(f"后端地址: {', '.join(u.name for u in UPSTREAMS.upstreams)}")
+    if len(UPSTREAMS.upstreams) > 1:
+        print(f"后端选择策略: {args.balance}")
+    print(f"后端超时: 连接 {BACKEND_CONNECT_TIMEOUT} 秒，响应 {BACKEND_TIMEOUT} 秒")
+    print(f"服务器引擎: {args.engine}")
+    if args.engine == 'pool':
+        print(f"线程池: {args.pool_size} 个线程，等待队列 {args.pool_queue}")
+    print(f"后端在途请求上限: {args.max_upstream or '不限制'}")
+    print(f"worker 进程数: {args.workers}")
+    print(f"API 短期缓存: {'开启' if args.api_cache else '关闭'}")
+    print(f"API 响应压缩: {'/'.join(PROXY_ENCODINGS) if args.api_compression else '关闭'}")
+    if PROFILER is not None:
+        print(f"性能分析输出目录: {PROFILER.out_dir}")
     print(f"项目根目录: {project_root}")
     print("=" * 50)
     print()
     
     # 检查端口是否被占用
-    if not check_port_available(PORT):
-        print(f"[错误] 端口 {PORT} 已被占用！")
-        print(f"请关闭占用该端口的程序，或修改server.py中的PORT配置")
+    if not check_port_available(args.port):
+        print(f"[错误] 端口 {args.port} 已被占用！")
+        print(f"请关闭占用该端口的程序，或使用 --port 指定其他端口")
         print(f"[提示] 使用80端口需要管理员权限，请以管理员身份运行！")
         sys.exit(1)
     
     # 检查构建后的前端文件
-    dist_dir = os.path.join(os.getcwd(), 'frontend', 'dist')
+    dist_dir = get_static_root()
     index_path = os.path.join(dist_dir, 'index.html')
     
     if not os.path.exists(index_path):
@@ -459,27 +4157,61 @@ def main():
             print("[建议] 请使用 start_app_production.bat 自动构建")
         print()
     
-    # 创建多线程服务器（支持并发处理）
+    # 生成静态文件清单，之后的请求只查清单；pre-fork 模式下 worker 继承主进程的清单
+    if not args.watch:
+        STATIC_MANIFEST.poll_interval = 0
+    manifest = STATIC_MANIFEST.load(get_static_root())
+    if args.workers <= 1:
+        # pre-fork 模式下 fork 之前不能有后台线程（子进程可能继承被持有的锁），由各 worker 自己启动
+        STATIC_MANIFEST.start_watching()
+    print(f"[信息] 静态文件清单: {len(manifest.entries)} 个文件，版本 {manifest.version}"
+          f"{'' if args.watch else '（不检查更新）'}")
+    if args.warmup:
+        # 在 fork 之前载入，pre-fork 模式下所有 worker 共享这份缓存
+        files, memory = STATIC_CACHE.preload(manifest)
+        print(f"[信息] 预热: 已载入 {files} 个静态文件到内存（{memory // 1024} KB）")
+    print()
+    banner = functools.partial(print_started_banner, args.port, started)
+    
+    server = None
     try:
-        server = ThreadingHTTPServer((HOST, PORT), CustomHTTPRequestHandler)
-        print(f"[成功] 服务器已启动")
-        print(f"[信息] 访问地址: http://localhost/")
-        print(f"[信息] 或访问: http://{DOMAIN}/")
-        print()
-        print("[提示] 如需使用域名访问，请在hosts文件中添加:")
-        print(f"       127.0.0.1    {DOMAIN}")
-        print()
-        print("按 Ctrl+C 停止服务器")
-        print("=" * 50)
-        print()
-        
-        # 启动服务器
-        server.serve_forever()
+        if args.workers > 1:
+            # 主进程只管理 worker，Ctrl+C 由主进程协调所有 worker 优雅退出
+            PreforkMaster(args, on_ready=banner).run()
+            print()
+            print("[信息] 服务器已停止")
+        elif args.engine == 'asyncio':
+            # 单线程事件循环，非阻塞处理大量并发长连接
+            if PROFILER is not None:
+                PROFILER.start()
+            run_asyncio_server(args.host, args.port, on_ready=banner, warmup=args.warmup)
+        else:
+            if args.engine == 'pool':
+                # 固定大小线程池，过载时快速返回 503
+                server = ThreadPoolHTTPServer((args.host, args.port), CustomHTTPRequestHandler,
+                                              args.pool_size, args.pool_queue)
+            else:
+                # 创建多线程服务器（支持并发处理）
+                server = ThreadingHTTPServer((args.host, args.port), CustomHTTPRequestHandler)
+            if PROFILER is not None:
+                PROFILER.start()
+            if args.warmup:
+                print(f"[信息] 预热: 已建立 {UPSTREAMS.warm(UPSTREAM_WARMUP_CONNECTIONS)} 个后端连接")
+            banner()
+            
+            # 启动服务器
+            server.serve_forever()
         
     except KeyboardInterrupt:
+        if server is not None:
+            server.shutdown()
+        UPSTREAMS.close_all()
+        if PROFILER is not None:
+            PROFILER.dump()
+            print(f"[信息] 性能分析结果已写入: {PROFILER.out_dir}")
+        stop_logging()
         print()
         print("[信息] 服务器已停止")
-        server.shutdown()
         sys.exit(0)
     except PermissionError:
         print(f"[错误] 权限不足！使用80端口需要管理员权限")
@@ -487,10 +4219,9 @@ def main():
         sys.exit(1)
     except Exception as e:
         print(f"[错误] 服务器启动失败: {e}")
-        if PORT == 80:
+        if args.port == 80:
             print(f"[提示] 使用80端口需要管理员权限，请以管理员身份运行！")
         sys.exit(1)
 
 if __name__ == '__main__':
     main()
-
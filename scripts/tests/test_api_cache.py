@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+ApiResponseCache 测试：请求合并（single-flight）、过期，以及写请求后的失效范围
+运行: python -m unittest discover -s scripts/tests
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+DASHBOARD = '/api/parent/dashboard'
+CHILD_DASHBOARD = '/api/child/dashboard'
+HEADERS = [('Content-Type', 'application/json'), ('ETag', '"v1"'), ('Date', 'x'), ('Connection', 'keep-alive')]
+
+
+def token(family_id):
+    """只带 familyId 的 JWT（缓存只解析载荷，不校验签名）"""
+    payload = base64.urlsafe_b64encode(json.dumps({'familyId': family_id}).encode()).decode().rstrip('=')
+    return f'Bearer header.{payload}.signature'
+
+
+class ApiResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = server.ApiResponseCache(ttls={DASHBOARD: 60.0, CHILD_DASHBOARD: 60.0})
+        self.cache.enabled = True
+
+    def store(self, path, authorization, body=b'{}'):
+        """以 leader 身份完成一次请求并缓存结果，返回缓存键"""
+        key = self.cache.cache_key(path, {'Authorization': authorization})
+        flight, leader = self.cache.begin(key)
+        self.assertTrue(leader)
+        self.cache.finish(key, flight, 200, HEADERS, body)
+        return key
+
+    def test_cache_key(self):
+        self.assertEqual(self.cache.cache_key(DASHBOARD + '?x=1', {'Authorization': 'a'}), (DASHBOARD + '?x=1', 'a'))
+        self.assertIsNone(self.cache.cache_key('/api/parent/tasks', {}))
+        self.cache.enabled = False
+        self.assertIsNone(self.cache.cache_key(DASHBOARD, {}))
+
+    def test_stores_only_cacheable_responses(self):
+        key = self.store(DASHBOARD, token('f1'))
+        entry = self.cache.get(key)
+        self.assertEqual(entry.etag, '"v1"')
+        self.assertEqual([name for name, _ in entry.headers], ['Content-Type', 'ETag'])
+
+        key = self.cache.cache_key(CHILD_DASHBOARD, {})
+        flight, _ = self.cache.begin(key)
+        self.assertIsNone(self.cache.finish(key, flight, 500, HEADERS, b'error'))
+        self.assertIsNone(self.cache.get(key))
+
+    def test_expired_entry_is_dropped(self):
+        self.cache.ttls = {DASHBOARD: 0.01}
+        key = self.store(DASHBOARD, token('f1'))
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get(key))
+
+    def test_single_flight(self):
+        key = self.cache.cache_key(DASHBOARD, {'Authorization': token('f1')})
+        flight, leader = self.cache.begin(key)
+        self.assertTrue(leader)
+        results = []
+        waiters = []
+        for _ in range(5):
+            waiter_flight, waiter_leader = self.cache.begin(key)
+            self.assertFalse(waiter_leader)
+            self.assertIs(waiter_flight, flight)
+            thread = threading.Thread(target=lambda: results.append(waiter_flight.wait(5)))
+            thread.start()
+            waiters.append(thread)
+        entry = self.cache.finish(key, flight, 200, HEADERS, b'{"ok": 1}')
+        for thread in waiters:
+            thread.join()
+        self.assertEqual(results, [entry] * 5)
+        # 请求结束后下一个请求重新成为 leader
+        self.assertTrue(self.cache.begin(key)[1])
+
+    def test_uncacheable_result_releases_waiters(self):
+        key = self.cache.cache_key(DASHBOARD, {})
+        flight, _ = self.cache.begin(key)
+        waiter_flight, _ = self.cache.begin(key)
+        self.cache.finish(key, flight)
+        # 等待者拿到 None，自行访问后端
+        self.assertIsNone(waiter_flight.wait(1))
+
+    def test_write_invalidates_same_family_only(self):
+        own = self.store(DASHBOARD, token('f1'))
+        own_child = self.store(CHILD_DASHBOARD, token('f1'))
+        other = self.store(DASHBOARD, token('f2'))
+        self.cache.invalidate('/api/child/tasks/1/submit', {'Authorization': token('f1')})
+        self.assertIsNone(self.cache.get(own))
+        self.assertIsNone(self.cache.get(own_child))
+        self.assertIsNotNone(self.cache.get(other))
+
+    def test_write_without_family_invalidates_route_prefix(self):
+        parent = self.store(DASHBOARD, token('f1'))
+        anonymous = self.store(DASHBOARD, '')
+        child = self.store(CHILD_DASHBOARD, token('f2'))
+        self.cache.invalidate('/api/parent/tasks/3', {'Authorization': 'Bearer not-a-jwt'})
+        self.assertIsNone(self.cache.get(parent))
+        self.assertIsNone(self.cache.get(anonymous))
+        self.assertIsNotNone(self.cache.get(child))
+
+    def test_write_during_request_discards_result(self):
+        key = self.cache.cache_key(DASHBOARD, {'Authorization': token('f1')})
+        flight, _ = self.cache.begin(key)
+        waiter_flight, _ = self.cache.begin(key)
+        self.cache.invalidate('/api/parent/tasks', {'Authorization': token('f1')})
+        # 写操作之前发出的请求结果可能已过时：不缓存，也不分享给等待者
+        self.assertIsNone(self.cache.finish(key, flight, 200, HEADERS, b'{}'))
+        self.assertIsNone(self.cache.get(key))
+        self.assertIsNone(waiter_flight.wait(1))
+
+    def test_write_for_other_family_keeps_inflight_result(self):
+        key = self.cache.cache_key(DASHBOARD, {'Authorization': token('f1')})
+        flight, _ = self.cache.begin(key)
+        self.cache.invalidate('/api/parent/tasks', {'Authorization': token('f2')})
+        self.assertIsNotNone(self.cache.finish(key, flight, 200, HEADERS, b'{}'))
+
+    def test_invalidation_stamps_are_bounded(self):
+        self.cache.max_entries = 4
+        for i in range(50):
+            self.cache.invalidate('/api/parent/tasks', {'Authorization': token(f'family-{i}')})
+        self.assertLessEqual(len(self.cache._invalidated), self.cache.max_entries + 1)
+
+    def test_disabled_cache_ignores_writes(self):
+        key = self.store(DASHBOARD, token('f1'))
+        self.cache.enabled = False
+        self.cache.invalidate('/api/parent/tasks', {'Authorization': token('f1')})
+        self.assertIsNotNone(self.cache.get(key))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+静态文件测试：StaticAssetCache 的按需加载（同一文件只加载一次）和 Range 解析
+运行: python -m unittest discover -s scripts/tests
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+
+def make_entry(directory, name, body):
+    """写出文件并生成对应的清单条目"""
+    fs_path = os.path.join(directory, name)
+    with open(fs_path, 'wb') as f:
+        f.write(body)
+    with open(fs_path, 'rb') as f:
+        etag = server.hash_file_etag(f)
+    return server.ManifestEntry(fs_path, os.stat(fs_path), etag)
+
+
+class CountingCache(server.StaticAssetCache):
+    """记录实际读取磁盘的次数，并放慢加载，让并发请求都落在加载期间"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loads = 0
+
+    def _load(self, manifest_entry):
+        self.loads += 1
+        time.sleep(0.05)
+        return super()._load(manifest_entry)
+
+
+class StaticAssetCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def test_concurrent_misses_load_once(self):
+        entry = make_entry(self.dir, 'app.js', b'console.log(1);' * 100)
+        cache = CountingCache()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get(entry))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.loads, 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertIn('gzip', results[0].variants)
+        self.assertEqual(cache.stats()['files'], 1)
+
+    def test_hit_after_load(self):
+        entry = make_entry(self.dir, 'app.css', b'body{}')
+        cache = CountingCache()
+        first = cache.get(entry)
+        self.assertIs(cache.get(entry), first)
+        self.assertEqual((cache.loads, cache.hits, cache.misses), (1, 1, 1))
+
+    def test_file_rewritten_after_manifest_is_not_cached(self):
+        entry = make_entry(self.dir, 'app.js', b'old')
+        with open(entry.fs_path, 'wb') as f:
+            f.write(b'new version')
+        cache = server.StaticAssetCache()
+        self.assertIsNone(cache.get(entry))
+        self.assertEqual(cache.stats()['files'], 0)
+
+    def test_large_file_is_not_cached(self):
+        entry = make_entry(self.dir, 'big.png', b'x' * 100)
+        cache = server.StaticAssetCache(max_file_size=10)
+        self.assertIsNone(cache.get(entry))
+
+    def test_lru_eviction_respects_memory_limit(self):
+        entries = [make_entry(self.dir, f'{name}.png', b'x' * 100) for name in 'abc']
+        cache = server.StaticAssetCache(max_bytes=250)
+        for entry in entries:
+            cache.get(entry)
+        self.assertEqual(cache.stats()['files'], 2)
+        self.assertLessEqual(cache.stats()['memory'], 250)
+
+
+class ResolveRangeTest(unittest.TestCase):
+    ETAG = '"abc"'
+    LAST_MODIFIED = 'Thu, 01 Jan 2026 00:00:00 GMT'
+
+    def resolve(self, range_header, size=100, if_range=None):
+        headers = {'Range': range_header}
+        if if_range is not None:
+            headers['If-Range'] = if_range
+        return server.resolve_range(headers, size, self.ETAG, self.LAST_MODIFIED)
+
+    def test_no_range(self):
+        self.assertIsNone(server.resolve_range({}, 100, self.ETAG, self.LAST_MODIFIED))
+
+    def test_closed_and_open_ranges(self):
+        self.assertEqual(self.resolve('bytes=0-9'), (0, 9))
+        self.assertEqual(self.resolve('bytes=90-'), (90, 99))
+        self.assertEqual(self.resolve('bytes=50-1000'), (50, 99))
+
+    def test_suffix_range(self):
+        self.assertEqual(self.resolve('bytes=-10'), (90, 99))
+        self.assertEqual(self.resolve('bytes=-1000'), (0, 99))
+        self.assertEqual(self.resolve('bytes=-0'), server.RANGE_NOT_SATISFIABLE)
+
+    def test_start_beyond_size_is_unsatisfiable(self):
+        self.assertEqual(self.resolve('bytes=100-'), server.RANGE_NOT_SATISFIABLE)
+        self.assertEqual(self.resolve('bytes=0-', size=0), server.RANGE_NOT_SATISFIABLE)
+
+    def test_unsupported_or_invalid_ranges_send_full_content(self):
+        for value in ('bytes=0-1,5-6', 'items=0-1', 'bytes=abc', 'bytes=5-2', 'bytes=x-'):
+            with self.subTest(range=value):
+                self.assertIsNone(self.resolve(value))
+
+    def test_if_range(self):
+        self.assertEqual(self.resolve('bytes=0-9', if_range=self.ETAG), (0, 9))
+        self.assertEqual(self.resolve('bytes=0-9', if_range=self.LAST_MODIFIED), (0, 9))
+        self.assertIsNone(self.resolve('bytes=0-9', if_range='"other"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
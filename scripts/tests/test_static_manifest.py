@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+静态文件清单测试：目录扫描、清单生成，以及不完整的构建不会被切换上线
+运行: python -m unittest discover -s scripts/tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+INDEX_V1 = b'<script src="/assets/app-v1.js"></script><link href="/assets/app-v1.css" rel="stylesheet">'
+INDEX_V2 = b'<script src="/assets/app-v2.js"></script><a href="/parent/tasks">tasks</a>'
+
+
+class DistTestCase(unittest.TestCase):
+    """在临时目录中模拟 frontend/dist"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def write(self, name, body):
+        fs_path = os.path.join(self.root, *name.strip('/').split('/'))
+        os.makedirs(os.path.dirname(fs_path), exist_ok=True)
+        with open(fs_path, 'wb') as f:
+            f.write(body)
+        return fs_path
+
+    def write_v1(self):
+        self.write('/index.html', INDEX_V1)
+        self.write('/assets/app-v1.js', b'console.log(1);')
+        self.write('/assets/app-v1.css', b'body{}')
+
+
+class AssetManifestTest(DistTestCase):
+
+    def test_scan_skips_hidden_files_and_directories(self):
+        self.write_v1()
+        self.write('/.git/config', b'[core]')
+        self.write('/.env', b'SECRET=1')
+        self.assertEqual(sorted(server.scan_dist(self.root)),
+                         ['/assets/app-v1.css', '/assets/app-v1.js', '/index.html'])
+
+    def test_missing_root_is_empty(self):
+        self.assertEqual(server.scan_dist(os.path.join(self.root, 'missing')), {})
+
+    def test_build_and_references(self):
+        self.write_v1()
+        manifest = server.AssetManifest.build(self.root, server.scan_dist(self.root))
+        self.assertEqual(manifest.missing_references(), [])
+        self.assertEqual(manifest.index_references(), {'/assets/app-v1.js', '/assets/app-v1.css'})
+        entry = manifest.entries['/assets/app-v1.js']
+        self.assertIn(entry.content_type, ('text/javascript', 'application/javascript'))
+        with open(entry.fs_path, 'rb') as f:
+            self.assertEqual(entry.etag, server.hash_file_etag(f))
+
+    def test_unchanged_files_reuse_previous_entries(self):
+        self.write_v1()
+        first = server.AssetManifest.build(self.root, server.scan_dist(self.root))
+        self.write('/assets/other.js', b'1')
+        second = server.AssetManifest.build(self.root, server.scan_dist(self.root), first)
+        self.assertIs(second.entries['/index.html'], first.entries['/index.html'])
+        self.assertNotEqual(second.version, first.version)
+
+    def test_missing_references(self):
+        self.write('/index.html', INDEX_V2)
+        manifest = server.AssetManifest.build(self.root, server.scan_dist(self.root))
+        # SPA 路由链接不算静态资源
+        self.assertEqual(manifest.missing_references(), ['/assets/app-v2.js'])
+
+    def test_missing_index(self):
+        self.write('/assets/app-v1.js', b'1')
+        manifest = server.AssetManifest.build(self.root, server.scan_dist(self.root))
+        self.assertEqual(manifest.missing_references(), [server.MANIFEST_INDEX])
+
+    def test_manifest_key_normalizes_path(self):
+        self.assertEqual(server.manifest_key('/assets/../index.html?v=1'), '/index.html')
+        self.assertEqual(server.manifest_key('/../../etc/passwd'), '/etc/passwd')
+        self.assertEqual(server.manifest_key('/assets/a%20b.js'), '/assets/a b.js')
+
+
+class StaticManifestTest(DistTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.write_v1()
+        self.manifests = server.StaticManifest()
+        self.first = self.manifests.load(self.root)
+
+    def settle(self):
+        """模拟后台线程：两次扫描结果一致后才尝试切换"""
+        pending = self.manifests.check()
+        return self.manifests.check(pending)
+
+    def test_unchanged_directory_keeps_manifest(self):
+        self.settle()
+        self.assertIs(self.manifests.get(), self.first)
+        self.assertEqual(self.manifests.reloads, 0)
+
+    def test_incomplete_build_is_rejected(self):
+        # 新的 index.html 已经写出，但它引用的 JS 还没有
+        self.write('/index.html', INDEX_V2)
+        with self.assertLogs(server.logger, 'WARNING') as logs:
+            self.settle()
+        self.assertIn('/assets/app-v2.js', logs.output[0])
+        self.assertIs(self.manifests.get(), self.first)
+        self.assertEqual(self.manifests.reloads, 0)
+
+        # 构建完成后切换到新版本
+        self.write('/assets/app-v2.js', b'console.log(2);')
+        with self.assertLogs(server.logger, 'INFO'):
+            self.settle()
+        current = self.manifests.get()
+        self.assertIsNot(current, self.first)
+        self.assertEqual(self.manifests.reloads, 1)
+        self.assertIn('/assets/app-v2.js', current.entries)
+
+    def test_directory_still_changing_is_not_switched(self):
+        pending = self.manifests.check()
+        self.write('/assets/late.js', b'1')
+        # 两次扫描之间有写入：这一次只记录签名
+        self.manifests.check(pending)
+        self.assertIs(self.manifests.get(), self.first)
+
+    def test_is_stale(self):
+        entry = self.first.entries['/assets/app-v1.js']
+        self.write('/assets/app-v1.js', b'rewritten during deploy')
+        st = os.stat(entry.fs_path)
+        self.assertTrue(self.manifests.is_stale(entry, st))
+        # --no-watch：清单不会更新，按磁盘上的实际版本提供
+        self.manifests.poll_interval = 0
+        self.assertFalse(self.manifests.is_stale(entry, st))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+UpstreamConnectionPool 测试：复用的长连接被后端关闭时，只重放 GET/HEAD
+运行: python -m unittest discover -s scripts/tests
+"""
+
+import os
+import sys
+import socket
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+
+class DroppingBackend:
+    """
+    只在本机监听的最小后端：每个连接正常回复第一个请求，
+    读完第二个请求后不回复直接关闭（模拟 keep-alive 连接在请求发出后被后端关闭）
+    """
+
+    def __init__(self):
+        self.sock = socket.create_server(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.received = []  # 后端实际收到的请求方法
+        self._lock = threading.Lock()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn, conn.makefile('rb') as rfile:
+            for served in range(2):
+                request_line = rfile.readline()
+                if not request_line:
+                    return
+                length = 0
+                for line in iter(rfile.readline, b'\r\n'):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                rfile.read(length)
+                with self._lock:
+                    self.received.append(request_line.split()[0].decode())
+                if served == 0:
+                    conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+
+    def close(self):
+        # 先 shutdown 唤醒阻塞在 accept 上的线程，否则套接字不会真正关闭
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class StaleConnectionRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = DroppingBackend()
+        self.addCleanup(self.backend.close)
+        self.pool = server.UpstreamConnectionPool('127.0.0.1', self.backend.port)
+        self.addCleanup(self.pool.close_all)
+
+    def fetch(self, method, body=None):
+        conn, response = self.pool.request(method, '/api/x', body=body, read_timeout=5)
+        data = response.read()
+        self.pool.release(conn, response)
+        return response.status, data
+
+    def test_get_is_retried_on_new_connection(self):
+        self.assertEqual(self.fetch('GET'), (200, b'ok'))
+        # 第二个 GET 复用连接后被丢弃，换新连接重试成功
+        self.assertEqual(self.fetch('GET'), (200, b'ok'))
+        self.assertEqual(self.backend.received, ['GET', 'GET', 'GET'])
+
+    def test_post_is_not_replayed_after_being_sent(self):
+        self.fetch('GET')
+        with self.assertRaises(ConnectionError):
+            self.fetch('POST', body=b'{}')
+        # 后端已经收到过这个 POST，不能再发一次
+        self.assertEqual(self.backend.received, ['GET', 'POST'])
+
+    def test_new_connection_failure_is_not_retried(self):
+        # 绑定后不监听的端口：连接被拒绝
+        with socket.socket() as unused:
+            unused.bind(('127.0.0.1', 0))
+            self.pool.port = unused.getsockname()[1]
+            with self.assertRaises(ConnectionRefusedError):
+                self.fetch('GET')
+
+
+if __name__ == '__main__':
+    unittest.main()
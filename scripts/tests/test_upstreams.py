@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+后端实例组测试：CircuitBreaker 状态机，以及 UpstreamGroup 的选择、熔断跳过和重试规则
+运行: python -m unittest discover -s scripts/tests
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+CircuitBreaker = server.CircuitBreaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker()
+
+    def trip(self, now=100.0):
+        for _ in range(server.CIRCUIT_MIN_REQUESTS):
+            self.breaker.record(True, now)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_stays_closed_below_min_requests(self):
+        for _ in range(server.CIRCUIT_MIN_REQUESTS - 1):
+            self.assertIsNone(self.breaker.record(True, 0.0))
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow(0.0))
+
+    def test_trips_on_failure_rate(self):
+        for i in range(server.CIRCUIT_MIN_REQUESTS - 1):
+            self.assertIsNone(self.breaker.record(i % 2 == 0, 0.0))
+        # 第 10 个请求失败：10 个里失败 5 个，达到 CIRCUIT_FAILURE_RATE
+        self.assertEqual(self.breaker.record(True, 0.0), CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.trips, 1)
+
+    def test_successes_alone_never_trip(self):
+        for _ in range(server.CIRCUIT_WINDOW * 2):
+            self.breaker.record(False, 0.0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_open_rejects_until_timeout(self):
+        self.trip(now=100.0)
+        self.assertFalse(self.breaker.allow(100.0 + server.CIRCUIT_OPEN_SECONDS - 0.5))
+        self.assertEqual(self.breaker.retry_after(101.0), server.CIRCUIT_OPEN_SECONDS - 1)
+        self.assertEqual(self.breaker.retry_after(200.0), 1)
+
+    def test_results_while_open_are_ignored(self):
+        self.trip()
+        self.assertIsNone(self.breaker.record(False, 101.0))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_half_open_limits_trials_and_recovers(self):
+        self.trip(now=100.0)
+        now = 100.0 + server.CIRCUIT_OPEN_SECONDS
+        for _ in range(server.CIRCUIT_HALF_OPEN_TRIALS):
+            self.assertTrue(self.breaker.allow(now))
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow(now))
+        for _ in range(server.CIRCUIT_HALF_OPEN_TRIALS - 1):
+            self.assertIsNone(self.breaker.record(False, now))
+        self.assertEqual(self.breaker.record(False, now), CircuitBreaker.CLOSED)
+        # 恢复后重新统计，之前的失败不再计入
+        self.assertEqual(len(self.breaker.results), 0)
+        self.assertTrue(self.breaker.allow(now))
+
+    def test_half_open_failure_reopens(self):
+        self.trip(now=100.0)
+        now = 100.0 + server.CIRCUIT_OPEN_SECONDS
+        self.assertTrue(self.breaker.allow(now))
+        self.assertEqual(self.breaker.record(True, now), CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.trips, 2)
+        self.assertFalse(self.breaker.allow(now + 1))
+
+    def test_unfinished_trials_restart_after_timeout(self):
+        self.trip(now=100.0)
+        now = 100.0 + server.CIRCUIT_OPEN_SECONDS
+        for _ in range(server.CIRCUIT_HALF_OPEN_TRIALS):
+            self.breaker.allow(now)
+        self.assertFalse(self.breaker.allow(now))
+        # 试探请求一直没有结果：再过 CIRCUIT_OPEN_SECONDS 秒重新开始一轮
+        self.assertTrue(self.breaker.allow(now + server.CIRCUIT_OPEN_SECONDS))
+
+
+class UpstreamGroupTest(unittest.TestCase):
+
+    def setUp(self):
+        # 只测试选择逻辑，不会真正连接这些地址
+        self.group = server.UpstreamGroup([('127.0.0.1', 1), ('127.0.0.1', 2)], balance='round-robin')
+        self.first, self.second = self.group.upstreams
+
+    def trip(self, upstream):
+        # 按当前时间熔断，CIRCUIT_OPEN_SECONDS 秒内保持 open
+        now = time.monotonic()
+        for _ in range(server.CIRCUIT_MIN_REQUESTS):
+            upstream.breaker.record(True, now)
+
+    def test_round_robin(self):
+        chosen = [self.group.choose() for _ in range(4)]
+        self.assertEqual(chosen, [self.first, self.second, self.first, self.second])
+        self.assertEqual(self.first.outstanding, 2)
+        self.group.finish(self.first)
+        self.assertEqual(self.first.outstanding, 1)
+
+    def test_least_outstanding(self):
+        self.group.balance = 'least-outstanding'
+        busy = self.group.choose()
+        self.assertIsNot(self.group.choose(), busy)
+
+    def test_skips_open_circuit(self):
+        self.trip(self.first)
+        self.assertEqual({self.group.choose() for _ in range(4)}, {self.second})
+
+    def test_all_open_raises_unavailable(self):
+        self.trip(self.first)
+        self.trip(self.second)
+        with self.assertRaises(server.UpstreamUnavailable) as raised:
+            self.group.choose()
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+    def test_retry_only_idempotent_methods(self):
+        self.assertIs(self.group.retry_target('GET', [self.first]), self.second)
+        self.assertIsNone(self.group.retry_target('POST', [self.first]))
+        self.assertIsNone(self.group.retry_target('GET', [self.first, self.second]))
+
+    def test_success_resets_consecutive_failures(self):
+        self.group.record(self.first, OSError('refused'))
+        self.assertEqual((self.first.failures, self.first.consecutive_failures), (1, 1))
+        self.group.record(self.first)
+        self.assertEqual((self.first.failures, self.first.consecutive_failures), (1, 0))
+        self.assertTrue(self.first.healthy)
+
+
+if __name__ == '__main__':
+    unittest.main()